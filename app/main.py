@@ -28,8 +28,13 @@ from sqlalchemy.orm import sessionmaker
 from app.middleware.cache import CacheMiddleware
 from app.middleware.context import ContextMiddleware
 from app.middleware.sessionmanager import SQLAlchemySessionManager
-from app.resources import polkascan, charts, oracle, estimates
-from app.settings import DB_CONNECTION, DEBUG, DOGPILE_CACHE_SETTINGS
+from app.resources import polkascan, charts, oracle, estimates, cache
+from app.settings import DB_CONNECTION, DEBUG, DOGPILE_CACHE_SETTINGS, RUNTIME_REGISTRY_REFRESH_INTERVAL, \
+    DB_REPLICA_CONNECTIONS, DB_REPLICA_SELECTION, DB_REPLICA_MAX_LAG, DB_REPLICA_LAG_CHECK_INTERVAL
+from app.utils.cache import LocalCache, ResponseCache
+from app.utils.chain_head import ChainHead
+from app.utils.replicas import Replica, ReplicaSet
+from app.utils.runtime_registry import RuntimeRegistry
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 # logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
@@ -38,6 +43,26 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 engine = create_engine(DB_CONNECTION, echo=DEBUG, isolation_level="READ_UNCOMMITTED", pool_pre_ping=True)
 session_factory = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# Read replicas, used for read-only requests only; tasks always use the primary session factory
+replica_set = None
+
+if DB_REPLICA_CONNECTIONS:
+    replicas = []
+
+    for replica_connection in DB_REPLICA_CONNECTIONS:
+        replica_engine = create_engine(
+            replica_connection, echo=DEBUG, isolation_level="READ_UNCOMMITTED", pool_pre_ping=True
+        )
+        replicas.append(Replica(replica_engine, sessionmaker(bind=replica_engine, autoflush=False, autocommit=False)))
+
+    replica_set = ReplicaSet(
+        engine,
+        replicas,
+        selection=DB_REPLICA_SELECTION,
+        max_lag=DB_REPLICA_MAX_LAG,
+        check_interval=DB_REPLICA_LAG_CHECK_INTERVAL
+    )
+
 # Define cache region
 cache_region = make_region().configure(
     'dogpile.cache.redis',
@@ -45,16 +70,38 @@ cache_region = make_region().configure(
         'host': DOGPILE_CACHE_SETTINGS['host'],
         'port': DOGPILE_CACHE_SETTINGS['port'],
         'db': DOGPILE_CACHE_SETTINGS['db'],
-        'redis_expiration_time': 60 * 60 * 6,  # 6 hours
-        'distributed_lock': True
+        'redis_expiration_time': DOGPILE_CACHE_SETTINGS['redis_expiration_time'],
+        'socket_timeout': DOGPILE_CACHE_SETTINGS['socket_timeout'],
+        'distributed_lock': True,
+        'lock_timeout': DOGPILE_CACHE_SETTINGS['lock_timeout'],
+        'lock_sleep': DOGPILE_CACHE_SETTINGS['lock_sleep']
     }
 )
 
+# Per-worker in-memory tier in front of the cache region
+response_cache = ResponseCache(
+    cache_region,
+    LocalCache(
+        max_size=DOGPILE_CACHE_SETTINGS['local_cache_max_size'],
+        expiration_time=DOGPILE_CACHE_SETTINGS['local_cache_expiration_time']
+    ),
+    lock_wait_time=DOGPILE_CACHE_SETTINGS['lock_wait_time'],
+    lock_sleep=DOGPILE_CACHE_SETTINGS['lock_sleep'],
+    retry_interval=DOGPILE_CACHE_SETTINGS['retry_interval'],
+    local_stale_time=DOGPILE_CACHE_SETTINGS['local_cache_stale_time']
+)
+chain_head = ChainHead(
+    cache_region,
+    expiration_time=DOGPILE_CACHE_SETTINGS['chain_head_expiration_time'],
+    max_age=DOGPILE_CACHE_SETTINGS['chain_head_max_age']
+)
+runtime_registry = RuntimeRegistry(refresh_interval=RUNTIME_REGISTRY_REFRESH_INTERVAL)
+
 # Define application
 app = falcon.API(middleware=[
     ContextMiddleware(),
-    SQLAlchemySessionManager(session_factory),
-    CacheMiddleware(cache_region)
+    SQLAlchemySessionManager(session_factory, replica_set),
+    CacheMiddleware(cache_region, response_cache, chain_head, runtime_registry)
 ])
 # substrate = SubstrateInterface(url=settings.SUBSTRATE_RPC_URL, type_registry_preset=settings.TYPE_REGISTRY)
 # Application routes
@@ -70,9 +117,11 @@ app.add_route('/oracle/pre_check_tasks', oracle.OraclePreCheckTaskListResource()
 app.add_route('/oracle/ares/author/{key}/{auth}', oracle.OracleAresAuthorityResource())
 app.add_route('/oracle/reward', oracle.OracleRequestsReward())
 app.add_route('/estimate/statistics/{symbol}/{id}', estimates.StatisticsEstimate())
+app.add_route('/cache/stats', cache.CacheStatisticsResource())
 
 app.add_route('/block', polkascan.BlockListResource())
 app.add_route('/block/{block_id}', polkascan.BlockDetailsResource())
+app.add_route('/block-gap', polkascan.BlockGapListResource())
 app.add_route('/block-total', polkascan.BlockTotalListResource())
 app.add_route('/block-total/{item_id}', polkascan.BlockTotalDetailsResource())
 app.add_route('/extrinsic', polkascan.ExtrinsicListResource())
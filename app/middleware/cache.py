@@ -21,14 +21,20 @@
 
 class CacheMiddleware:
 
-    def __init__(self, cache_region):
+    def __init__(self, cache_region, response_cache, chain_head, runtime_registry):
         self.cache_region = cache_region
+        self.response_cache = response_cache
+        self.chain_head = chain_head
+        self.runtime_registry = runtime_registry
 
     def process_request(self, req, resp):
         pass
 
     def process_resource(self, req, resp, resource, params):
         resource.cache_region = self.cache_region
+        resource.response_cache = self.response_cache
+        resource.chain_head = self.chain_head
+        resource.runtime_registry = self.runtime_registry
 
     def process_response(self, req, resp, resource, req_succeeded):
         pass
@@ -22,12 +22,26 @@ from sqlalchemy.orm import scoped_session
 
 
 class SQLAlchemySessionManager:
+    """ Sets the session of the resource. Read-only requests use a session on one of the read replicas when
+    available, all other requests use the primary
+    """
 
-    def __init__(self, session_factory):
+    read_only_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, session_factory, replica_set=None):
         self.session_factory = session_factory
+        self.replica_set = replica_set
+
+    def get_replica(self, req):
+        if self.replica_set and req.method in self.read_only_methods:
+            return self.replica_set.get_replica()
 
     def process_resource(self, req, resp, resource, params):
-        resource.session = scoped_session(self.session_factory)
+        replica = self.get_replica(req)
+
+        resource.replica = replica
+        resource.primary_session_factory = self.session_factory
+        resource.session = scoped_session(replica.session_factory if replica else self.session_factory)
 
     def process_response(self, req, resp, resource, req_succeeded):
         if hasattr(resource, 'session'):
@@ -31,6 +31,8 @@ from app.settings import SUBSTRATE_ADDRESS_TYPE
 class BaseModelObj(DictableModel):
 
     serialize_exclude = None
+    # Columns read by serialize_formatting_hook, loaded even when not requested in a sparse fieldset
+    serialize_required_fields = []
 
     def save(self, session):
         session.add(self)
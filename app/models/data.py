@@ -19,7 +19,6 @@
 #  data.py
 
 import sqlalchemy as sa
-from sqlalchemy import text
 from sqlalchemy.orm import relationship, column_property
 from sqlalchemy.dialects.mysql import LONGTEXT
 
@@ -164,22 +163,8 @@ class Block(BaseModel):
 
     @classmethod
     def get_missing_block_ids(cls, session):
-        return session.execute(text("""
-                                            SELECT
-                                              z.expected as block_from, z.got-1 as block_to
-                                            FROM (
-                                             SELECT
-                                              @rownum:=@rownum+1 AS expected,
-                                              IF(@rownum=id, 0, @rownum:=id) AS got
-                                             FROM
-                                              (SELECT @rownum:=0) AS a
-                                              JOIN data_block
-                                              ORDER BY id
-                                             ) AS z
-                                            WHERE z.got!=0
-                                            ORDER BY block_from DESC
-                                            """)
-                               )
+        """ Missing block ranges up to the last scanned block, maintained by BlockGapTask """
+        return session.query(BlockGap.block_from, BlockGap.block_to).order_by(BlockGap.block_from.desc())
 
     def get_x_axis_value(self):
         return self.id
@@ -189,6 +174,7 @@ class BlockTotal(BaseModel):
     __tablename__ = 'data_block_total'
 
     serialize_type = 'block-total'
+    serialize_required_fields = ['author']
 
     id = sa.Column(sa.Integer(), primary_key=True, autoincrement=False)
     session_id = sa.Column(sa.Integer())
@@ -306,6 +292,8 @@ class Event(BaseModel):
 class Extrinsic(BaseModel):
     __tablename__ = 'data_extrinsic'
 
+    serialize_required_fields = ['address']
+
     block_id = sa.Column(sa.Integer(), primary_key=True, index=True)
     block = relationship(Block, foreign_keys=[block_id], primaryjoin=block_id == Block.id)
 
@@ -377,6 +365,8 @@ class Extrinsic(BaseModel):
 class Log(BaseModel):
     __tablename__ = 'data_log'
 
+    serialize_required_fields = ['type_id', 'data']
+
     block_id = sa.Column(sa.Integer(), primary_key=True, autoincrement=False)
     log_idx = sa.Column(sa.Integer(), primary_key=True, autoincrement=False)
     type_id = sa.Column(sa.Integer(), index=True)
@@ -439,6 +429,8 @@ class Session(BaseModel):
 class SessionValidator(BaseModel):
     __tablename__ = 'data_session_validator'
 
+    serialize_required_fields = ['validator_stash', 'validator_controller', 'validator_session']
+
     session_id = sa.Column(sa.Integer(), primary_key=True, autoincrement=False)
     rank_validator = sa.Column(sa.Integer(), primary_key=True, autoincrement=False, index=True)
     validator_stash = sa.Column(sa.String(64), index=True)
@@ -492,6 +484,8 @@ class SessionValidator(BaseModel):
 class SessionNominator(BaseModel):
     __tablename__ = 'data_session_nominator'
 
+    serialize_required_fields = ['nominator_stash', 'nominator_controller']
+
     session_id = sa.Column(sa.Integer(), primary_key=True, autoincrement=False)
     rank_validator = sa.Column(sa.Integer(), primary_key=True, autoincrement=False, index=True)
     rank_nominator = sa.Column(sa.Integer(), primary_key=True, autoincrement=False, index=True)
@@ -529,6 +523,8 @@ class SessionNominator(BaseModel):
 class AccountIndex(BaseModel):
     __tablename__ = 'data_account_index'
 
+    serialize_required_fields = ['account_id']
+
     id = sa.Column(sa.Integer(), primary_key=True, autoincrement=False)
     short_address = sa.Column(sa.String(24), index=True)
     account_id = sa.Column(sa.String(64), index=True)
@@ -786,3 +782,84 @@ class SearchIndexType(BaseModel):
     id = sa.Column(sa.Integer(), primary_key=True)
     name = sa.Column(sa.String(64), nullable=False, index=True)
 
+
+
+class SymbolPriceRollupMixin:
+    """ OHLC of the normalised prices of a symbol per time bucket, maintained by SymbolPriceRollupTask """
+
+    # Bucket size in seconds
+    bucket_seconds = None
+
+    symbol = sa.Column(sa.String(64), primary_key=True)
+    # Unix timestamp of the start of the bucket
+    timestamp = sa.Column(sa.Integer(), primary_key=True, autoincrement=False)
+    open = sa.Column(sa.Float(), nullable=False)
+    high = sa.Column(sa.Float(), nullable=False)
+    low = sa.Column(sa.Float(), nullable=False)
+    close = sa.Column(sa.Float(), nullable=False)
+    sum = sa.Column(sa.Float(), nullable=False)
+    count = sa.Column(sa.Integer(), nullable=False)
+    first_block_id = sa.Column(sa.Integer(), nullable=False)
+    last_block_id = sa.Column(sa.Integer(), nullable=False, index=True)
+
+    def serialize_id(self):
+        return '{}-{}'.format(self.symbol, self.timestamp)
+
+
+class SymbolPriceMinute(SymbolPriceRollupMixin, BaseModel):
+    __tablename__ = 'data_symbol_price_minute'
+
+    bucket_seconds = 60
+
+
+class SymbolPriceHour(SymbolPriceRollupMixin, BaseModel):
+    __tablename__ = 'data_symbol_price_hour'
+
+    bucket_seconds = 60 * 60
+
+
+class SymbolPriceDay(SymbolPriceRollupMixin, BaseModel):
+    __tablename__ = 'data_symbol_price_day'
+
+    bucket_seconds = 60 * 60 * 24
+
+
+class ChainMetricRollup(BaseModel):
+    """ Chain metrics per hour, day and week, maintained by ChainMetricRollupTask """
+    __tablename__ = 'data_chain_metric_rollup'
+
+    interval = sa.Column(sa.String(8), primary_key=True)
+    # Unix timestamp (UTC) of the start of the interval
+    timestamp = sa.Column(sa.Integer(), primary_key=True, autoincrement=False)
+    first_block_id = sa.Column(sa.Integer(), nullable=False)
+    last_block_id = sa.Column(sa.Integer(), nullable=False, index=True)
+    blocks = sa.Column(sa.Integer(), nullable=False)
+    blocktime = sa.Column(sa.Numeric(precision=65, scale=0), nullable=False)
+    accounts_new = sa.Column(sa.Integer(), nullable=False)
+    extrinsics_signed = sa.Column(sa.Integer(), nullable=False)
+    events = sa.Column(sa.Integer(), nullable=False)
+    transfers = sa.Column(sa.Integer(), nullable=False)
+
+    def serialize_id(self):
+        return '{}-{}'.format(self.interval, self.timestamp)
+
+
+class BlockGap(BaseModel):
+    """ Range of missing blocks, maintained by BlockGapTask """
+    __tablename__ = 'data_block_gap'
+
+    serialize_type = 'block-gap'
+
+    block_from = sa.Column(sa.Integer(), primary_key=True, autoincrement=False)
+    block_to = sa.Column(sa.Integer(), nullable=False)
+
+    def serialize_id(self):
+        return '{}-{}'.format(self.block_from, self.block_to)
+
+
+class BlockGapScan(BaseModel):
+    """ Watermark of BlockGapTask: blocks up to `scanned_up_to` are either harvested or part of a BlockGap """
+    __tablename__ = 'data_block_gap_scan'
+
+    id = sa.Column(sa.Integer(), primary_key=True, autoincrement=False)
+    scanned_up_to = sa.Column(sa.Integer(), nullable=False)
@@ -17,27 +17,76 @@
 #  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
 #
 #  base.py
+import copy
+import gzip
+import json
 from abc import ABC, abstractmethod
+from hashlib import blake2b
+from urllib.parse import urlencode
 
 import falcon
 from dogpile.cache import CacheRegion
-from dogpile.cache.api import NO_VALUE
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, and_, inspect, func, literal_column
+from sqlalchemy.orm import Session, scoped_session, sessionmaker, Query, load_only
 from substrateinterface import SubstrateInterface
 
 from app import settings, resources
-from app.settings import MAX_RESOURCE_PAGE_SIZE, DOGPILE_CACHE_SETTINGS
+from app.settings import MAX_RESOURCE_PAGE_SIZE, MAX_RESOURCE_PAGE_OFFSET, MAX_RESOURCE_COUNT, DOGPILE_CACHE_SETTINGS
+from app.models.data import Block
+from app.utils.cache import ResponseCache
+from app.utils.chain_head import ChainHead
+from app.utils.replicas import Replica
+from app.utils.runtime_registry import RuntimeRegistry
 
 metadata_store = {}
 
 
 class BaseResource(object):
     session: Session
+    # Read replica the session is bound to, None when bound to the primary
+    replica: Replica = None
+    primary_session_factory: sessionmaker
     cache_region: CacheRegion
+    response_cache: ResponseCache
+    chain_head: ChainHead
+    runtime_registry: RuntimeRegistry
 
 
 class JSONAPIResource(BaseResource):
     cache_expiration_time = None
+    # Maximum age of an expired response that is served while it is refreshed in the background
+    cache_stale_while_revalidate = None
+
+    def get_cache_version(self, head):
+        """ Version of the cached response, responses stored with a lower version are expired """
+        return None
+
+    def get_cache_expiration_time(self, head, **kwargs):
+        return self.cache_expiration_time
+
+    def get_cache_params(self, params):
+        """ Query parameters that identify a cached response, with defaults applied """
+        return {key: value for key, value in params.items() if value not in ('', [], None)}
+
+    @staticmethod
+    def format_cache_params(params):
+        formatted_params = []
+
+        for key, value in sorted(params.items()):
+            if type(value) is list:
+                value = ','.join(sorted(set(value)))
+            formatted_params.append('{}={}'.format(key, value))
+
+        return '&'.join(formatted_params)
+
+    def get_cache_key(self, req, **kwargs):
+        """ Canonical cache key, independent of host, scheme and order of query parameters """
+        return '{}:{}:{}:{}'.format(
+            req.method,
+            self.__class__.__name__,
+            '/'.join('{}={}'.format(key, value) for key, value in sorted(kwargs.items())),
+            self.format_cache_params(self.get_cache_params(req.params))
+        )
 
     def apply_filters(self, query, params):
         return query
@@ -45,12 +94,42 @@ class JSONAPIResource(BaseResource):
     def get_meta(self):
         return {}
 
-    def serialize_item(self, item):
+    def serialize_item(self, item, exclude=None):
         if hasattr(item, 'serialize'):
-            return item.serialize()
+            return item.serialize(exclude=exclude)
         else:
             return item
 
+    def get_include_list(self, params):
+        include_list = params.get('include', [])
+
+        if type(include_list) is not list:
+            include_list = include_list.split(',')
+
+        return include_list
+
+    @staticmethod
+    def get_sparse_fields(params, serialize_type):
+        """ Requested attributes of given type in JSON:API sparse fieldset notation (fields[type]=a,b) """
+        fields = params.get('fields[{}]'.format(serialize_type))
+
+        if not fields:
+            return None
+
+        if type(fields) is not list:
+            fields = fields.split(',')
+
+        return set(fields)
+
+    def apply_sparse_fields(self, data, params):
+        if type(data) is dict and type(data.get('attributes')) is dict:
+            fields = self.get_sparse_fields(params, data.get('type'))
+
+            if fields is not None:
+                data['attributes'] = {key: value for key, value in data['attributes'].items() if key in fields}
+
+        return data
+
     def process_get_response(self, req, resp, **kwargs):
         return {
             'status': falcon.HTTP_200,
@@ -100,59 +179,416 @@ class JSONAPIResource(BaseResource):
 
     def on_get(self, req, resp, **kwargs):
 
-        cache_key = '{}-{}'.format(req.method, req.url)
+        cache_key = self.get_cache_key(req, **kwargs)
 
         if self.cache_expiration_time:
-            # Try to retrieve request from cache
-            cache_response = self.cache_region.get(cache_key, self.cache_expiration_time)
-
-            if cache_response is not NO_VALUE:
+            head = self.chain_head.get(self.session)
+
+            # Retrieve request from cache, only one worker processes the request when it is missing or expired
+            cache_response, cache_tier = self.response_cache.get_or_create(
+                cache_key,
+                lambda: self.encode_response(self.get_versioned_response(req, resp, head, **kwargs)),
+                self.get_cache_expiration_time(head, params=req.params, **kwargs),
+                should_cache_fn=lambda response: response.get('cacheable'),
+                version=self.get_cache_version(head),
+                stale_while_revalidate=self.cache_stale_while_revalidate,
+                async_creator=lambda: self.process_get_response_async(req, resp, **kwargs)
+            )
+
+            if cache_tier:
                 resp.set_header('X-Cache', 'HIT')
-
+                resp.set_header('X-Cache-Tier', cache_tier)
             else:
-                # Process request
-                cache_response = self.process_get_response(req, resp, **kwargs)
+                resp.set_header('X-Cache', 'MISS')
+        else:
+            cache_response = self.encode_response(self.process_get_response(req, resp, **kwargs))
+
+        self.write_response(req, resp, cache_response)
+
+    def process_get_response_async(self, req, resp, **kwargs):
+        """ Processes the request outside of the request cycle, on a copy of the resource with its own session """
+        resource = copy.copy(self)
+        resource.session = scoped_session(self.session.session_factory)
+
+        try:
+            return resource.encode_response(
+                resource.get_versioned_response(req, resp, resource.chain_head.get(resource.session), **kwargs)
+            )
+        finally:
+            resource.session.remove()
 
-                if cache_response.get('cacheable'):
-                    # Store result in cache
-                    self.cache_region.set(cache_key, cache_response)
-                    resp.set_header('X-Cache', 'MISS')
+    def get_versioned_response(self, req, resp, head, **kwargs):
+        """ Processes the request. A response rendered on a replica that lags behind the head is versioned with
+        the last block of the replica, so it is regenerated once the head advances instead of kept for the head
+        :param head: chain head the cache version is based on
+        :returns: processed response, see process_get_response
+        """
+        response = self.process_get_response(req, resp, **kwargs)
+        version = self.get_cache_version(head)
+
+        if self.replica is not None and version is not None and 'version' not in response:
+            replica_block_id = self.session.query(func.max(Block.id)).scalar()
+
+            if replica_block_id is not None and replica_block_id < version:
+                response['version'] = replica_block_id
+
+        return response
+
+    def use_primary_session(self):
+        """ Rebinds the resource to the primary for the rest of the request, for data a replica can lack """
+        if self.replica is not None:
+            self.session.remove()
+            self.session = scoped_session(self.primary_session_factory)
+            self.replica = None
+
+    def encode_response(self, response):
+        """ Replaces the media of a processed response with its encoded body, so it can be cached and
+        written to the client as is
+        :param response: dict with status, media and cacheable
+        :returns: dict with status, encoded body, ETag and cacheable. Bodies of at least compress_min_size bytes
+        are only kept gzip compressed, as most clients accept gzip
+        """
+        if response.get('media') is None:
+            body = None
+            etag = None
         else:
-            cache_response = self.process_get_response(req, resp, **kwargs)
+            body = json.dumps(response['media'], ensure_ascii=False).encode('utf-8')
+            etag = '"{}"'.format(blake2b(body, digest_size=16).hexdigest())
+
+        compressed = bool(body) and bool(DOGPILE_CACHE_SETTINGS['compress_min_size']) and \
+            len(body) >= DOGPILE_CACHE_SETTINGS['compress_min_size']
+
+        if compressed:
+            body = gzip.compress(body, compresslevel=DOGPILE_CACHE_SETTINGS['compress_level'])
+
+        encoded_response = {key: value for key, value in response.items() if key != 'media'}
+        encoded_response.update({
+            'body': body,
+            'compressed': compressed,
+            'etag': etag
+        })
+
+        return encoded_response
+
+    @staticmethod
+    def etag_matches(req, etags):
+        if_none_match = req.get_header('If-None-Match')
+
+        if not if_none_match:
+            return False
+
+        # Weak comparison as required for If-None-Match
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag == '*' or tag in etags or (tag[0:2] == 'W/' and tag[2:] in etags):
+                return True
 
-        resp.status = cache_response.get('status')
-        resp.media = cache_response.get('media')
+        return False
+
+    def write_response(self, req, resp, response):
+        resp.status = response.get('status')
+
+        if response.get('body') is None:
+            return
+
+        body = response['body']
+        etag = response.get('etag')
+
+        if response.get('compressed'):
+            resp.append_header('Vary', 'Accept-Encoding')
+
+            if 'gzip' in (req.get_header('Accept-Encoding') or ''):
+                resp.set_header('Content-Encoding', 'gzip')
+                # Compressed representation needs its own strong ETag
+                etag = etag and '{}-gzip"'.format(etag[:-1])
+            else:
+                body = gzip.decompress(body)
+
+        if etag:
+            resp.set_header('ETag', etag)
+
+            if response.get('status') == falcon.HTTP_200 and \
+                    self.etag_matches(req, [response['etag'], etag]):
+                # Client already has this representation
+                resp.status = falcon.HTTP_304
+                return
+
+        resp.content_type = falcon.MEDIA_JSON
+        resp.data = body
 
 
 class JSONAPIListResource(JSONAPIResource, ABC):
     cache_expiration_time = DOGPILE_CACHE_SETTINGS['default_list_cache_expiration_time']
+    # Expire cached lists as soon as a new block is harvested
+    cache_head_versioned = True
+    # Unique, descending sort columns of the query that enable cursor paging with page[after] and page[before]
+    cursor_columns = None
+    # Restrict the query to the columns of a sparse fieldset of the queried model. Disabled for resources that
+    # serialize their rows to another type, as these read columns the fieldset of the model does not name
+    sparse_columns = True
+    count_cache_expiration_time = DOGPILE_CACHE_SETTINGS['count_cache_expiration_time']
+
+    def get_cache_version(self, head):
+        if self.cache_head_versioned and head and head.get('block_id') is not None:
+            return head['block_id']
+
+    def get_cache_expiration_time(self, head, **kwargs):
+        if self.get_cache_version(head) is not None:
+            return max(self.cache_expiration_time, DOGPILE_CACHE_SETTINGS['head_versioned_cache_expiration_time'])
+
+        return self.cache_expiration_time
+
+    def get_list_relationships(self, include_list, items):
+        """ Related objects of the items on the page, loaded per relationship for the whole page at once
+        :param include_list: requested relationship names
+        :param items: items of the page
+        :returns: dict of relationship name -> list with the related objects of each item, in order of items
+        """
+        return {}
 
-    def get_included_items(self, items):
-        return []
+    def get_included_items(self, data, relationships, params):
+        """ Adds relationships to the serialized items and returns the related objects, without duplicates
+        :param data: serialized items
+        :param relationships: result of get_list_relationships()
+        :param params: request parameters
+        :returns: list of serialized related objects
+        """
+        included = {}
+
+        for name, related_items in relationships.items():
+            for obj, related_objects in zip(data, related_items):
+                obj.setdefault('relationships', {})[name] = {
+                    'data': [{'type': related.serialize_type, 'id': related.serialize_id()}
+                             for related in related_objects]
+                }
+
+                for related in related_objects:
+                    included.setdefault((related.serialize_type, related.serialize_id()), related)
+
+        return [self.apply_sparse_fields(related.serialize(), params) for related in included.values()]
+
+    def get_total(self, query, params):
+        """ Total number of items matching the filters
+        :param query: filtered query, before paging
+        :param params: request parameters
+        :returns: tuple of (total, exact) or None when no total is available
+        """
+        return None
+
+    def get_cached_count(self, query, params):
+        """ Counts the filtered query up to MAX_RESOURCE_COUNT rows, so the cost of a count is bounded for any
+        filter value. The result is kept in the response cache
+        :param query: filtered query, before paging
+        :param params: request parameters
+        :returns: number of rows, or "<MAX_RESOURCE_COUNT>+" beyond the limit
+        """
+        params = {key: value for key, value in self.get_cache_params(params).items() if not key.startswith('page[')}
+
+        def count():
+            rows = query.with_entities(literal_column('1')).order_by(None).limit(MAX_RESOURCE_COUNT + 1).subquery()
+            total = self.session.query(func.count()).select_from(rows).scalar()
+
+            if total > MAX_RESOURCE_COUNT:
+                return {'total': '{}+'.format(MAX_RESOURCE_COUNT)}
+
+            return {'total': total}
+
+        value, cache_tier = self.response_cache.get_or_create(
+            'count:{}:{}'.format(self.__class__.__name__, self.format_cache_params(params)),
+            count,
+            expiration_time=self.count_cache_expiration_time
+        )
+
+        return value['total']
+
+    def get_cache_params(self, params):
+        params = super().get_cache_params(params)
+
+        # Equal pages are requested with and without default paging parameters
+        try:
+            params['page[number]'] = int(params.get('page[number]', 1))
+            params['page[size]'] = min(int(params.get('page[size]', 25)), MAX_RESOURCE_PAGE_SIZE)
+        except (TypeError, ValueError):
+            pass
+
+        return params
 
     @abstractmethod
     def get_query(self):
         raise NotImplementedError()
 
+    def get_page_size(self, params):
+        return min(int(params.get('page[size]', 25)), MAX_RESOURCE_PAGE_SIZE)
+
+    def get_item_cursor(self, item):
+        return '-'.join(str(getattr(item, column.key)) for column in self.cursor_columns)
+
+    def parse_cursor(self, cursor):
+        try:
+            values = [int(value) for value in cursor.split('-')]
+        except ValueError:
+            values = []
+
+        if len(values) != len(self.cursor_columns):
+            raise falcon.HTTPBadRequest('Invalid cursor', 'Cursor must be formatted as {}'.format(
+                '-'.join(column.key for column in self.cursor_columns)
+            ))
+
+        return values
+
+    def get_cursor_filter(self, values, descending, columns=None):
+        """ Row comparison (a, b) < (x, y) written as a < x OR (a = x AND b < y), so MySQL uses the index """
+        columns = columns or self.cursor_columns
+
+        if descending:
+            condition = columns[0] < values[0]
+        else:
+            condition = columns[0] > values[0]
+
+        if len(columns) == 1:
+            return condition
+
+        return or_(condition, and_(
+            columns[0] == values[0],
+            self.get_cursor_filter(values[1:], descending, columns[1:])
+        ))
+
     def apply_paging(self, query, params):
+        page_size = self.get_page_size(params)
+
+        if self.cursor_columns and params.get('page[after]'):
+            query = query.filter(self.get_cursor_filter(self.parse_cursor(params.get('page[after]')), True))
+            return query[:page_size]
+
+        if self.cursor_columns and params.get('page[before]'):
+            query = query.filter(self.get_cursor_filter(self.parse_cursor(params.get('page[before]')), False))
+            query = query.order_by(None).order_by(*[column.asc() for column in self.cursor_columns])
+            return list(reversed(query[:page_size]))
+
         page = int(params.get('page[number]', 1)) - 1
-        page_size = min(int(params.get('page[size]', 25)), MAX_RESOURCE_PAGE_SIZE)
+
+        if self.cursor_columns and page * page_size > MAX_RESOURCE_PAGE_OFFSET:
+            # Lists without cursor columns have no alternative, so their deep pages remain available
+            raise falcon.HTTPBadRequest(
+                'Page out of range',
+                'Pages beyond {} items are not available by page[number], use page[after]'.format(
+                    MAX_RESOURCE_PAGE_OFFSET
+                )
+            )
+
         return query[page * page_size: page * page_size + page_size]
 
-    def serialize_items(self, items):
-        return [self.serialize_item(item) for item in items]
+    def get_links(self, req, items):
+        """ JSON:API next and prev links, relative so cached responses are independent of the host """
+        params = {key: value for key, value in req.params.items() if not key.startswith('page[')}
+        params['page[size]'] = self.get_page_size(req.params)
+        links = {}
+
+        def link(**page_params):
+            return '{}?{}'.format(req.path, urlencode(sorted({**params, **page_params}.items()), doseq=True))
+
+        if self.cursor_columns and req.params.get('page[before]'):
+            # Paging backwards, the page was requested from an item after it. A short page means there are no
+            # items before it, while the items after it continue from its last item
+            if items:
+                links['next'] = link(**{'page[after]': self.get_item_cursor(items[-1])})
+
+            if items and len(items) == params['page[size]']:
+                links['prev'] = link(**{'page[before]': self.get_item_cursor(items[0])})
+        elif self.cursor_columns:
+            if items and len(items) == params['page[size]']:
+                links['next'] = link(**{'page[after]': self.get_item_cursor(items[-1])})
+
+            if items and (req.params.get('page[after]') or int(req.params.get('page[number]', 1)) > 1):
+                links['prev'] = link(**{'page[before]': self.get_item_cursor(items[0])})
+        else:
+            page = int(req.params.get('page[number]', 1))
+
+            if len(items) == params['page[size]']:
+                links['next'] = link(**{'page[number]': page + 1})
+
+            if page > 1:
+                links['prev'] = link(**{'page[number]': page - 1})
+
+        return links
+
+    def serialize_items(self, items, exclude=None):
+        """ Serializes the items of the page
+        :param items: items of the page
+        :param exclude: columns left out of the serialized items, see get_sparse_exclude()
+        :returns: list of serialized items
+        """
+        return [self.serialize_item(item, exclude=exclude) for item in items]
+
+    def get_sparse_columns(self, query, params):
+        """ Columns of the queried model to load for the sparse fieldset requested for that model
+        :param query: list query
+        :param params: request parameters
+        :returns: tuple of (load, exclude) column names, or None when no sparse fieldset applies
+        """
+        if not self.sparse_columns or not isinstance(query, Query):
+            return None
+
+        model = query.column_descriptions[0]['entity']
+
+        if model is None or not hasattr(model, 'serialize_required_fields'):
+            return None
+
+        serialize_type = model.serialize_type if type(model.serialize_type) is str else model.__name__.lower()
+        fields = self.get_sparse_fields(params, serialize_type)
+
+        if fields is None:
+            return None
+
+        column_keys = inspect(model).column_attrs.keys()
+        load_fields = [key for key in column_keys if key in fields.union(model.serialize_required_fields)]
+
+        return load_fields, [key for key in column_keys if key not in load_fields]
+
+    def apply_fields(self, query, params):
+        """ Only loads the requested columns from the database when a sparse fieldset is requested for the
+        queried model
+        """
+        sparse_columns = self.get_sparse_columns(query, params)
+
+        if sparse_columns is None:
+            return query
+
+        return query.options(load_only(*sparse_columns[0]))
+
+    def get_sparse_exclude(self, query, params):
+        """ Columns deferred by apply_fields(), left out when serializing so they are not loaded per item """
+        sparse_columns = self.get_sparse_columns(query, params)
+
+        if sparse_columns is None:
+            return None
+
+        return sparse_columns[1]
 
     def process_get_response(self, req, resp, **kwargs):
-        items = self.get_query()
-        items = self.apply_filters(items, req.params)
-        items = self.apply_paging(items, req.params)
+        query = self.get_query()
+        query = self.apply_filters(query, req.params)
+        items = self.apply_paging(self.apply_fields(query, req.params), req.params)
+
+        meta = self.get_meta()
+        total = self.get_total(query, req.params)
+
+        if total:
+            meta['total'], meta['total_exact'] = total
+
+        data = [
+            self.apply_sparse_fields(obj, req.params)
+            for obj in self.serialize_items(items, exclude=self.get_sparse_exclude(query, req.params))
+        ]
+        relationships = self.get_list_relationships(self.get_include_list(req.params), items)
 
         return {
             'status': falcon.HTTP_200,
             'media': self.get_jsonapi_response(
-                data=self.serialize_items(items),
-                meta=self.get_meta(),
-                included=self.get_included_items(items)
+                data=data,
+                meta=meta,
+                links=self.get_links(req, items),
+                included=self.get_included_items(data, relationships, req.params)
             ),
             'cacheable': True
         }
@@ -164,6 +600,32 @@ class JSONAPIDetailResource(JSONAPIResource, ABC):
     def get_item_url_name(self):
         return 'item_id'
 
+    def get_item_block_id(self, item_id):
+        """ Block number the requested item belongs to, when it can be derived from the item id """
+        return None
+
+    def get_cache_version(self, head):
+        # Only negative responses for blocks beyond the head are versioned, see process_get_response
+        if head and head.get('block_id') is not None:
+            return head['block_id']
+
+    def is_immutable_response(self, params):
+        """ Whether the response only holds data of its block, e.g. no embedded account with a balance, so it
+        never changes once the block is finalized
+        :param params: request parameters
+        """
+        return True
+
+    def get_cache_expiration_time(self, head, params=None, **kwargs):
+        block_id = self.get_item_block_id(kwargs.get(self.get_item_url_name()))
+
+        if block_id is not None and head and head.get('finalized_block_id') and \
+                block_id <= head['finalized_block_id'] and self.is_immutable_response(params or {}):
+            # Items at or below the finalized head never change
+            return DOGPILE_CACHE_SETTINGS['immutable_cache_expiration_time']
+
+        return self.cache_expiration_time
+
     @abstractmethod
     def get_item(self, item_id):
         raise NotImplementedError()
@@ -172,13 +634,31 @@ class JSONAPIDetailResource(JSONAPIResource, ABC):
         return {}
 
     def process_get_response(self, req, resp, **kwargs):
-        item = self.get_item(kwargs.get(self.get_item_url_name()))
+        item_id = kwargs.get(self.get_item_url_name())
+        item = self.get_item(item_id)
+
+        if not item and self.replica is not None:
+            # Items missing on a replica can exist on the primary when the replica lags behind, the 404 is only
+            # cached when the primary confirms it
+            self.use_primary_session()
+            item = self.get_item(item_id)
 
         if not item:
+            # Short lived negative entry, for not yet existing blocks only until the head advances
+            block_id = self.get_item_block_id(item_id)
+            head = self.chain_head.get(self.session)
+
+            if block_id is not None and head.get('block_id') is not None and block_id > head['block_id']:
+                version = head['block_id']
+            else:
+                version = None
+
             response = {
                 'status': falcon.HTTP_404,
                 'media': None,
-                'cacheable': False
+                'cacheable': True,
+                'expiration_time': DOGPILE_CACHE_SETTINGS['not_found_cache_expiration_time'],
+                'version': version
             }
 
         else:
@@ -186,11 +666,12 @@ class JSONAPIDetailResource(JSONAPIResource, ABC):
             response = {
                 'status': falcon.HTTP_200,
                 'media': self.get_jsonapi_response(
-                    data=self.serialize_item(item),
-                    relationships=self.get_relationships(req.params.get('include', []), item),
+                    data=self.apply_sparse_fields(self.serialize_item(item), req.params),
+                    relationships=self.get_relationships(self.get_include_list(req.params), item),
                     meta=self.get_meta()
                 ),
-                'cacheable': True
+                'cacheable': True,
+                'version': None
             }
 
         return response
@@ -0,0 +1,22 @@
+import falcon
+
+from app.resources.base import JSONAPIResource
+
+
+class CacheStatisticsResource(JSONAPIResource):
+
+    def process_get_response(self, req, resp, **kwargs):
+        return {
+            'status': falcon.HTTP_200,
+            'media': self.get_jsonapi_response(
+                data={
+                    'type': 'cachestats',
+                    'id': 'worker',
+                    'attributes': {
+                        'tiers': self.response_cache.stats.asdict(),
+                        'local_cache_size': len(self.response_cache.local_cache)
+                    }
+                }
+            ),
+            'cacheable': False
+        }
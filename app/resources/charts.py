@@ -1,8 +1,112 @@
-from app.resources.base import JSONAPIDetailResource
+import time
 
+import falcon
 
-class ExtrinsicSigned(JSONAPIDetailResource):
-    cache_expiration_time = 3600 * 5
+from app.models.data import ChainMetricRollup
+from app.resources.base import JSONAPIResource
+from app.settings import MAX_CHART_POINTS
+from app.utils.chain_metrics import CHAIN_METRIC_INTERVALS, CHAIN_METRICS, get_interval_start, get_metric_value
 
-    def get_item(self, item_id):
-        return self.cache_region.get("ares_charts", self.cache_expiration_time)
+# Charts returned without a metric parameter
+DEFAULT_CHARTS = [
+    ('accounts_new', 'sum', 'Total new accounts by day (UTC)'),
+    ('blocktime', 'avg', 'Average blocktime by day (UTC)'),
+    ('extrinsics_signed', 'sum', 'Total transactions by day (UTC)')
+]
+DEFAULT_CHART_DAYS = 14
+
+
+class ExtrinsicSigned(JSONAPIResource):
+    cache_expiration_time = 300
+
+    def get_rollups(self, interval, from_time, to_time):
+        return ChainMetricRollup.query(self.session).filter(
+            ChainMetricRollup.interval == interval,
+            ChainMetricRollup.timestamp >= get_interval_start(interval, from_time),
+            ChainMetricRollup.timestamp < to_time
+        ).order_by(ChainMetricRollup.timestamp).all()
+
+    def get_series(self, params):
+        """ Series of the requested `metric` per `interval` between `from` and `to` (unix timestamps) """
+        metric = params.get('metric')
+        interval = params.get('interval', 'day')
+
+        if metric not in CHAIN_METRICS:
+            raise falcon.HTTPBadRequest('Invalid metric', 'Metric must be one of {}'.format(', '.join(CHAIN_METRICS)))
+
+        if interval not in CHAIN_METRIC_INTERVALS:
+            raise falcon.HTTPBadRequest('Invalid interval', 'Interval must be one of {}'.format(
+                ', '.join(CHAIN_METRIC_INTERVALS)
+            ))
+
+        length = CHAIN_METRIC_INTERVALS[interval][0]
+
+        try:
+            to_time = int(params.get('to', time.time()))
+            from_time = int(params.get('from', to_time - length * MAX_CHART_POINTS))
+        except ValueError:
+            raise falcon.HTTPBadRequest('Invalid range', 'From and to must be unix timestamps')
+
+        # Limit the number of points of a single response
+        from_time = max(from_time, to_time - length * MAX_CHART_POINTS)
+
+        return {
+            'type': 'chart',
+            'id': '{}-{}-{}-{}'.format(interval, metric, from_time, to_time),
+            'attributes': {
+                'metric': metric,
+                'interval': interval,
+                'from': from_time,
+                'to': to_time,
+                'data': [
+                    [rollup.timestamp * 1000, get_metric_value(rollup, metric)]
+                    for rollup in self.get_rollups(interval, from_time, to_time)
+                ]
+            }
+        }
+
+    def get_default_charts(self):
+        # Complete days only, up to and including yesterday
+        to_time = get_interval_start('day', int(time.time()))
+        rollups = self.get_rollups('day', to_time - CHAIN_METRIC_INTERVALS['day'][0] * DEFAULT_CHART_DAYS, to_time)
+
+        return [
+            {
+                "type": "chart",
+                "id": "utcday-{}-{}-line-{}".format(metric, metric_type, DEFAULT_CHART_DAYS),
+                "attributes": {
+                    "table": "utcday",
+                    "metric": metric,
+                    "metric_type": metric_type,
+                    "type": "line",
+                    "limit": DEFAULT_CHART_DAYS,
+                    "column": "{}_{}".format(metric, metric_type),
+                    "title": title,
+                    "data": {
+                        "x_axis_type": "datetime",
+                        "series": [
+                            {
+                                "name": title,
+                                "type": "line",
+                                "data": [[rollup.timestamp * 1000, get_metric_value(rollup, metric)]
+                                         for rollup in rollups]
+                            }
+                        ]
+                    },
+                    "active": True
+                }
+            }
+            for metric, metric_type, title in DEFAULT_CHARTS
+        ]
+
+    def process_get_response(self, req, resp, **kwargs):
+        if req.params.get('metric'):
+            data = self.get_series(req.params)
+        else:
+            data = self.get_default_charts()
+
+        return {
+            'status': falcon.HTTP_200,
+            'media': self.get_jsonapi_response(data=data),
+            'cacheable': True
+        }
@@ -4,6 +4,8 @@ from sqlalchemy import func
 from app.models.data import EstimatesParticipants
 from app.resources.base import JSONAPIResource
 
+ESTIMATE_PERCENTILES = [10, 25, 75, 90]
+
 
 class StatisticsEstimate(JSONAPIResource):
     cache_expiration_time = 60 * 10
@@ -29,17 +31,34 @@ class StatisticsEstimate(JSONAPIResource):
             estimate_id=estimate_id
         ).first()
         if tmp and tmp.estimate_type == 'price':
-            results = EstimatesParticipants.query(self.session).filter_by(symbol=symbol, estimate_id=estimate_id).all()
-            items = [row for row in results]
-            items.sort(key=lambda r: r.price)
-            sum_price = 0
-            for item in items:
-                sum_price += item.price
+            total, sum_price, avg_price, min_price, max_price = self.session.query(
+                func.count(EstimatesParticipants.price),
+                func.sum(EstimatesParticipants.price),
+                func.avg(EstimatesParticipants.price),
+                func.min(EstimatesParticipants.price),
+                func.max(EstimatesParticipants.price)
+            ).filter_by(symbol=symbol, estimate_id=estimate_id).one()
+
+            if not total:
+                return {"total": 0}
+
+            # Only the prices at the positions of the median and percentiles are retrieved
+            positions = {
+                str(percentile): min(total * percentile // 100, total - 1) for percentile in ESTIMATE_PERCENTILES
+            }
+            prices = {
+                position: self.get_price_at(symbol, estimate_id, position)
+                for position in set(positions.values()) | {total // 2}
+            }
 
             return {
-                "total": len(items),
-                "avg": str(sum_price / len(items)),
-                "median": str(items[len(items) // 2].price)
+                "total": total,
+                "sum": str(sum_price),
+                "avg": str(avg_price),
+                "median": str(prices[total // 2]),
+                "min": str(min_price),
+                "max": str(max_price),
+                "percentiles": {percentile: str(prices[position]) for percentile, position in positions.items()}
             }
         if tmp and tmp.estimate_type == 'range':
             results = self.session.query(EstimatesParticipants.option_index,
@@ -47,3 +66,9 @@ class StatisticsEstimate(JSONAPIResource):
                 filter_by(symbol=symbol, estimate_id=estimate_id). \
                 group_by(EstimatesParticipants.option_index).all()
             return [{"index": row[0], "count": row[1]} for row in results]
+
+    def get_price_at(self, symbol, estimate_id, position):
+        """ Price at given position of the participant prices of an estimate, in ascending order """
+        return self.session.query(EstimatesParticipants.price).filter_by(
+            symbol=symbol, estimate_id=estimate_id
+        ).filter(EstimatesParticipants.price.isnot(None)).order_by(EstimatesParticipants.price).offset(position).limit(1).scalar()
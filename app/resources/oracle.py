@@ -1,3 +1,5 @@
+import time
+
 import falcon
 from sqlalchemy.orm import load_only
 from substrateinterface import SubstrateInterface
@@ -5,7 +7,8 @@ from substrateinterface import SubstrateInterface
 from app import utils
 from app.models.data import SymbolSnapshot, PriceRequest, EraPriceRequest
 from app.resources.base import JSONAPIDetailResource, JSONAPIListResource, create_substrate, JSONAPIResource
-from app.settings import SUBSTRATE_ADDRESS_TYPE
+from app.settings import SUBSTRATE_ADDRESS_TYPE, MAX_PRICE_BUCKETS
+from app.utils.prices import PRICE_RESOLUTIONS, get_price_series
 from app.utils.ss58 import ss58_encode
 
 
@@ -60,10 +63,15 @@ class OracleDetailResource(JSONAPIDetailResource):
     def get_item_url_name(self):
         return 'symbol'
 
-    def get_item(self, item_id):
-        print("Kami debug of resources/oracle. run 1")
-        symbol_prices: [SymbolSnapshot] = SymbolSnapshot.query(self.session).filter_by(
-            symbol=item_id).order_by(SymbolSnapshot.block_id.desc()).limit(1000)[:1000]
+    def get_item(self, item_id, include_auth=False):
+        if include_auth:
+            symbol_prices = SymbolSnapshot.query(self.session).filter_by(
+                symbol=item_id).order_by(SymbolSnapshot.block_id.desc())[:1000]
+        else:
+            symbol_prices = SymbolSnapshot.query(self.session).options(
+                load_only('block_id', 'price', 'fraction', 'created_at')
+            ).filter_by(symbol=item_id).order_by(SymbolSnapshot.block_id.desc())[:1000]
+
         data = {
             'name': 'Price',
             'type': 'line',
@@ -72,14 +80,66 @@ class OracleDetailResource(JSONAPIDetailResource):
                     price.block_id,
                     price.price,
                     price.fraction,
-                    price.created_at.timestamp(),
-                    [[ss58_encode(auth[0].replace('0x', ''), SUBSTRATE_ADDRESS_TYPE), auth[1]] for auth in price.auth]
+                    price.created_at.timestamp()
                 ]
                 for price in symbol_prices
             ]
         }
+
+        # Per-authority prices only on request, as encoding every authority of every row is expensive
+        if include_auth:
+            for row, price in zip(data['data'], symbol_prices):
+                row.append(
+                    [[ss58_encode(auth[0].replace('0x', ''), SUBSTRATE_ADDRESS_TYPE), auth[1]] for auth in price.auth]
+                )
+
         return data
 
+    def get_buckets(self, symbol, params):
+        """ Price buckets of the requested `resolution` between `from` and `to` (unix timestamps) """
+        seconds = PRICE_RESOLUTIONS.get(params.get('resolution'))
+
+        if seconds is None:
+            raise falcon.HTTPBadRequest('Invalid resolution', 'Resolution must be one of {}'.format(
+                ', '.join(PRICE_RESOLUTIONS)
+            ))
+
+        try:
+            to_time = int(params.get('to', time.time()))
+            from_time = int(params.get('from', to_time - seconds * MAX_PRICE_BUCKETS))
+        except ValueError:
+            raise falcon.HTTPBadRequest('Invalid range', 'From and to must be unix timestamps')
+
+        # Limit the number of buckets of a single response
+        from_time = max(from_time, to_time - seconds * MAX_PRICE_BUCKETS)
+
+        return {
+            'name': 'Price',
+            'type': 'ohlc',
+            'resolution': params.get('resolution'),
+            'from': from_time,
+            'to': to_time,
+            'data': [
+                [bucket['timestamp'], bucket['open'], bucket['high'], bucket['low'], bucket['close'],
+                 bucket['mean'], bucket['count']]
+                for bucket in get_price_series(self.session, symbol, params.get('resolution'), from_time, to_time)
+            ]
+        }
+
+    def process_get_response(self, req, resp, **kwargs):
+        symbol = kwargs.get(self.get_item_url_name())
+
+        if req.params.get('resolution'):
+            data = self.get_buckets(symbol, req.params)
+        else:
+            data = self.get_item(symbol, include_auth='auth' in self.get_include_list(req.params))
+
+        return {
+            'status': falcon.HTTP_200,
+            'media': self.get_jsonapi_response(data=data),
+            'cacheable': True
+        }
+
 
 class OracleRequestsReward(JSONAPIDetailResource):
     cache_expiration_time = 0
@@ -90,6 +150,7 @@ class OracleRequestsReward(JSONAPIDetailResource):
 
 class OraclePreCheckTaskListResource(JSONAPIListResource):
     cache_expiration_time = 300
+    cache_head_versioned = False
     substrate: SubstrateInterface = None
 
     def __init__(self, substrate: SubstrateInterface = None):
@@ -20,68 +20,215 @@
 from hashlib import blake2b
 
 import binascii
+from concurrent.futures import ThreadPoolExecutor
 
 import falcon
 import pytz
-from dogpile.cache.api import NO_VALUE
 from scalecodec.type_registry import load_type_registry_preset
-from sqlalchemy import func, tuple_, or_
-from sqlalchemy.orm import defer, subqueryload, lazyload
+from sqlalchemy import func, tuple_, or_, select
+from sqlalchemy.orm import defer, undefer, subqueryload, lazyload
 
 from app import settings
-from app.models.data import Block, Extrinsic, Event, RuntimeCall, RuntimeEvent, Runtime, RuntimeModule, \
+from app.models.data import Block, Extrinsic, Event, RuntimeCall, RuntimeEvent, RuntimeModule, \
     RuntimeCallParam, RuntimeEventAttribute, RuntimeType, RuntimeStorage, Account, Session, Contract, \
-    BlockTotal, SessionValidator, Log, AccountIndex, RuntimeConstant, SessionNominator, \
-    RuntimeErrorMessage, SearchIndex, AccountInfoSnapshot
+    BlockTotal, SessionValidator, Log, AccountIndex, RuntimeConstant, SessionNominator, BlockGap, BlockGapScan, \
+    SearchIndex, AccountInfoSnapshot
 from app.resources.base import JSONAPIResource, JSONAPIListResource, JSONAPIDetailResource, BaseResource
+from app.utils.chain_head import ChainHead
 from app.utils.ss58 import ss58_decode, ss58_encode
 from scalecodec.base import RuntimeConfiguration
 from substrateinterface import SubstrateInterface
 
+# Shared by the requests of the worker, each loader checks out a pooled connection of its own
+relationship_executor = ThreadPoolExecutor(max_workers=settings.RELATIONSHIP_LOADER_WORKERS)
+
+
+def get_counter_total(resource, counter):
+    """ Total of an unfiltered list from the running counters of the latest BlockTotal
+    :param resource: resource with session and chain_head
+    :param counter: function that returns the total from a BlockTotal row
+    :returns: tuple of (total, exact) or None when no totals are harvested yet
+    """
+    block_total = BlockTotal.query(resource.session).order_by(BlockTotal.id.desc()).first()
+
+    if block_total:
+        head = resource.chain_head.get(resource.session)
+
+        # Counters are exact when totals are harvested up to the head
+        return int(counter(block_total)), head.get('block_id') is None or block_total.id >= head['block_id']
+
+
+def has_filters(params, filters):
+    return any(params.get('filter[{}]'.format(name)) for name in filters)
+
+
+def search_index_filter(columns, index_columns, index_type_ids, account_id):
+    """ Semi-join on the account search index, so filtering and paging are done by the database
+    :param columns: columns identifying the filtered rows, e.g. (Event.block_id, Event.event_idx)
+    :param index_columns: matching columns of SearchIndex
+    :param index_type_ids: search index types to match
+    :param account_id: account to match
+    :returns: filter expression
+    """
+    return tuple_(*columns).in_(
+        select(index_columns).where(
+            SearchIndex.index_type_id.in_(index_type_ids),
+            SearchIndex.account_id == account_id
+        )
+    )
+
+
+def get_transfer_accounts(session, events):
+    """ Sender and destination accounts of Transfer events, retrieved with a single query
+    :param session: database session
+    :param events: balances Transfer events (other events are skipped)
+    :returns: dict of account id -> Account
+    """
+    account_ids = set()
+
+    for event in events:
+        if event.event_id == 'Transfer':
+            account_ids.update(attribute.replace('0x', '') for attribute in event.attributes[0:2])
+
+    if not account_ids:
+        return {}
+
+    return {account.id: account for account in Account.query(session).filter(Account.id.in_(list(account_ids)))}
+
+
+def serialize_transfer_account(accounts, account_id):
+    account_id = account_id.replace('0x', '')
+
+    if account_id in accounts:
+        return accounts[account_id].serialize()
+
+    return {
+        'type': 'account',
+        'id': account_id,
+        'attributes': {
+            'id': account_id,
+            'address': ss58_encode(account_id, settings.SUBSTRATE_ADDRESS_TYPE)
+        }
+    }
+
 
 class BlockDetailsResource(JSONAPIDetailResource):
 
     def get_item_url_name(self):
         return 'block_id'
 
+    def get_item_block_id(self, item_id):
+        if item_id.isnumeric():
+            return int(item_id)
+
     def get_item(self, item_id):
         if item_id.isnumeric():
             return Block.query(self.session).filter_by(id=item_id).first()
         else:
             return Block.query(self.session).filter_by(hash=item_id).first()
 
+    def is_immutable_response(self, params):
+        # Signed extrinsics embed the account of their signer
+        return not {'extrinsics', 'transactions'} & set(self.get_include_list(params))
+
     def get_relationships(self, include_list, item):
-        relationships = {}
+        loaders = {}
+
+        if {'extrinsics', 'transactions', 'inherents'} & set(include_list):
+            # Transactions and inherents are the signed and unsigned extrinsics of the block, so a single query
+            # is partitioned instead of querying each of them
+            loaders['extrinsics'] = lambda session: Extrinsic.query(session).filter_by(block_id=item.id).order_by(
+                'extrinsic_idx').all()
+        if 'events' in include_list:
+            loaders['events'] = lambda session: Event.query(session).filter_by(block_id=item.id).order_by(
+                'event_idx').all()
+        if 'logs' in include_list:
+            loaders['logs'] = lambda session: Log.query(session).filter_by(block_id=item.id).order_by(
+                'log_idx').all()
+
+        relationships = self.load_concurrently(loaders)
+        extrinsics = relationships.pop('extrinsics', None)
 
         if 'extrinsics' in include_list:
-            relationships['extrinsics'] = Extrinsic.query(self.session).filter_by(block_id=item.id).order_by(
-                'extrinsic_idx')
+            relationships['extrinsics'] = extrinsics
         if 'transactions' in include_list:
-            relationships['transactions'] = Extrinsic.query(self.session).options(defer('params')).filter_by(block_id=item.id, signed=1).order_by(
-                'extrinsic_idx')
+            relationships['transactions'] = [extrinsic for extrinsic in extrinsics if extrinsic.signed == 1]
         if 'inherents' in include_list:
-            relationships['inherents'] = Extrinsic.query(self.session).options(defer('params')).filter_by(block_id=item.id, signed=0).order_by(
-                'extrinsic_idx')
-        if 'events' in include_list:
-            relationships['events'] = Event.query(self.session).filter_by(block_id=item.id).order_by(
-                'event_idx')
-        if 'logs' in include_list:
-            relationships['logs'] = Log.query(self.session).filter_by(block_id=item.id).order_by(
-                'log_idx')
+            relationships['inherents'] = [extrinsic for extrinsic in extrinsics if extrinsic.signed == 0]
 
         return relationships
 
+    def load_concurrently(self, loaders):
+        """ Runs the loaders in parallel, each in a session of its own so they use separate pooled connections
+        :param loaders: dict of name and function accepting a session
+        :returns: dict of name and the detached result of its loader
+        """
+        if len(loaders) < 2:
+            return {name: loader(self.session) for name, loader in loaders.items()}
+
+        def load(loader):
+            session = self.session.session_factory()
+
+            try:
+                result = loader(session)
+                session.expunge_all()
+                return result
+            finally:
+                session.close()
+
+        futures = {name: relationship_executor.submit(load, loader) for name, loader in loaders.items()}
+
+        return {name: future.result() for name, future in futures.items()}
+
 
 class BlockListResource(JSONAPIListResource):
 
+    cursor_columns = (Block.id,)
+
     def get_query(self):
         return Block.query(self.session).order_by(
             Block.id.desc()
         )
 
+    def get_total(self, query, params):
+        head = self.chain_head.get(self.session)
+
+        if head.get('block_id') is not None:
+            # Estimate, missing blocks are not accounted for
+            return head['block_id'] + 1, False
+
+
+class BlockGapListResource(JSONAPIListResource):
+
+    cache_head_versioned = False
+
+    def get_query(self):
+        return BlockGap.query(self.session).order_by(BlockGap.block_from.desc())
+
+    def get_meta(self):
+        scan = BlockGapScan.query(self.session).get(1)
+        head = self.chain_head.get(self.session)
+
+        return {
+            'scanned_up_to': scan.scanned_up_to if scan else None,
+            'missing_blocks': int(self.session.query(
+                func.coalesce(func.sum(BlockGap.block_to - BlockGap.block_from + 1), 0)
+            ).scalar()),
+            'head': head.get('block_id'),
+            'finalized_head': head.get('finalized_block_id')
+        }
+
 
 class BlockTotalDetailsResource(JSONAPIDetailResource):
 
+    def is_immutable_response(self, params):
+        # Embeds the account of the author
+        return False
+
+    def get_item_block_id(self, item_id):
+        if item_id.isnumeric():
+            return int(item_id)
+
     def get_item(self, item_id):
         if item_id.isnumeric():
             return BlockTotal.query(self.session).get(item_id)
@@ -132,23 +279,44 @@ class BlockTotalListResource(JSONAPIListResource):
 
         return query
 
+    def get_list_relationships(self, include_list, items):
+        relationships = {}
+
+        if 'author' in include_list:
+            author_ids = {item.author for item in items if item.author}
+            accounts = {}
+
+            if author_ids:
+                accounts = {
+                    account.id: account for account in
+                    Account.query(self.session).filter(Account.id.in_(list(author_ids)))
+                }
+
+            relationships['author'] = [
+                [accounts[item.author]] if item.author in accounts else [] for item in items
+            ]
+
+        return relationships
+
 
 class ExtrinsicListResource(JSONAPIListResource):
 
+    cache_stale_while_revalidate = 30
+    cursor_columns = (Extrinsic.block_id, Extrinsic.extrinsic_idx)
     exclude_params = True
 
     def get_query(self):
         return Extrinsic.query(self.session).options(defer('params')).order_by(
-            Extrinsic.block_id.desc()
+            Extrinsic.block_id.desc(), Extrinsic.extrinsic_idx.desc()
         )
 
-    def serialize_item(self, item):
+    def serialize_item(self, item, exclude=None):
         # Exclude large params from list view
 
         if self.exclude_params:
-            data = item.serialize(exclude=['params'])
+            data = item.serialize(exclude=list(exclude or []) + ['params'])
         else:
-            data = item.serialize()
+            data = item.serialize(exclude=exclude)
 
         # Add account as relationship
         if item.account:
@@ -156,9 +324,40 @@ class ExtrinsicListResource(JSONAPIListResource):
             data['attributes']['account'] = item.account.serialize()
         return data
 
-    # def get_included_items(self, items):
-    #     # Include account items
-    #     return [item.account.serialize() for item in items if item.account]
+    def get_list_relationships(self, include_list, items):
+        relationships = {}
+
+        if 'account' in include_list:
+            # Accounts of the page are already loaded with a single subquery (lazy='subquery')
+            relationships['account'] = [[item.account] if item.account else [] for item in items]
+
+        if 'events' in include_list:
+            events = {}
+
+            if items:
+                for event in Event.query(self.session).filter(
+                    tuple_(Event.block_id, Event.extrinsic_idx).in_(
+                        list({(item.block_id, item.extrinsic_idx) for item in items})
+                    )
+                ).order_by(Event.block_id, Event.event_idx):
+                    events.setdefault((event.block_id, event.extrinsic_idx), []).append(event)
+
+            relationships['events'] = [events.get((item.block_id, item.extrinsic_idx), []) for item in items]
+
+        return relationships
+
+    def get_total(self, query, params):
+
+        if not has_filters(params, ['address', 'search_index', 'module_id', 'call_id']):
+
+            if params.get('filter[signed]') == '1':
+                return get_counter_total(self, lambda block_total: block_total.total_extrinsics_signed)
+            elif params.get('filter[signed]') == '0':
+                return get_counter_total(self, lambda block_total: block_total.total_extrinsics_unsigned)
+            elif not params.get('filter[signed]'):
+                return get_counter_total(self, lambda block_total: block_total.total_extrinsics)
+
+        return self.get_cached_count(query, params), False
 
     def apply_filters(self, query, params):
 
@@ -177,17 +376,16 @@ class ExtrinsicListResource(JSONAPIListResource):
         if params.get('filter[search_index]'):
 
             self.exclude_params = False
+            query = query.options(undefer('params'))
 
             if type(params.get('filter[search_index]')) != list:
                 params['filter[search_index]'] = [params.get('filter[search_index]')]
 
-            search_index = SearchIndex.query(self.session).filter(
-                SearchIndex.index_type_id.in_(params.get('filter[search_index]')),
-                SearchIndex.account_id == account_id
-            ).order_by(SearchIndex.sorting_value.desc())
-
-            query = query.filter(tuple_(Extrinsic.block_id, Extrinsic.extrinsic_idx).in_(
-                [[s.block_id, s.extrinsic_idx] for s in search_index]
+            query = query.filter(search_index_filter(
+                (Extrinsic.block_id, Extrinsic.extrinsic_idx),
+                [SearchIndex.block_id, SearchIndex.extrinsic_idx],
+                params.get('filter[search_index]'),
+                account_id
             ))
         else:
 
@@ -214,9 +412,17 @@ class ExtrinsicListResource(JSONAPIListResource):
 
 class ExtrinsicDetailResource(JSONAPIDetailResource):
 
+    def is_immutable_response(self, params):
+        # Embeds the account of the signer
+        return False
+
     def get_item_url_name(self):
         return 'extrinsic_id'
 
+    def get_item_block_id(self, item_id):
+        if item_id[0:2] != '0x' and len(item_id.split('-')) == 2 and item_id.split('-')[0].isnumeric():
+            return int(item_id.split('-')[0])
+
     def get_item(self, item_id):
 
         if item_id[0:2] == '0x':
@@ -266,11 +472,9 @@ class ExtrinsicDetailResource(JSONAPIDetailResource):
     def serialize_item(self, item):
         data = item.serialize()
 
-        runtime_call = RuntimeCall.query(self.session).filter_by(
-            module_id=item.module_id,
-            call_id=item.call_id,
-            spec_version=item.spec_version_id
-        ).first()
+        runtime_call = self.runtime_registry.get_call(
+            self.session, item.spec_version_id, item.module_id, item.call_id
+        )
 
         data['attributes']['documentation'] = runtime_call.documentation
 
@@ -298,11 +502,12 @@ class ExtrinsicDetailResource(JSONAPIDetailResource):
             if extrinsic_failed_event:
                 if 'Module' in extrinsic_failed_event.attributes[0]['value']:
 
-                    error = RuntimeErrorMessage.query(self.session).filter_by(
-                        module_index=extrinsic_failed_event.attributes[0]['value']['Module']['index'],
-                        index=extrinsic_failed_event.attributes[0]['value']['Module']['error'],
-                        spec_version=item.spec_version_id
-                    ).first()
+                    error = self.runtime_registry.get_error(
+                        self.session,
+                        item.spec_version_id,
+                        extrinsic_failed_event.attributes[0]['value']['Module']['index'],
+                        extrinsic_failed_event.attributes[0]['value']['Module']['error']
+                    )
 
                     if error:
                         data['attributes']['error_message'] = error.documentation
@@ -316,6 +521,9 @@ class ExtrinsicDetailResource(JSONAPIDetailResource):
 
 class EventsListResource(JSONAPIListResource):
 
+    cache_stale_while_revalidate = 30
+    cursor_columns = (Event.block_id, Event.event_idx)
+
     def apply_filters(self, query, params):
 
         if params.get('filter[address]'):
@@ -335,13 +543,11 @@ class EventsListResource(JSONAPIListResource):
             if type(params.get('filter[search_index]')) != list:
                 params['filter[search_index]'] = [params.get('filter[search_index]')]
 
-            search_index = SearchIndex.query(self.session).filter(
-                SearchIndex.index_type_id.in_(params.get('filter[search_index]')),
-                SearchIndex.account_id == account_id
-            ).order_by(SearchIndex.sorting_value.desc())
-
-            query = query.filter(tuple_(Event.block_id, Event.event_idx).in_(
-                [[s.block_id, s.event_idx] for s in search_index]
+            query = query.filter(search_index_filter(
+                (Event.block_id, Event.event_idx),
+                [SearchIndex.block_id, SearchIndex.event_idx],
+                params.get('filter[search_index]'),
+                account_id
             ))
         else:
 
@@ -358,15 +564,27 @@ class EventsListResource(JSONAPIListResource):
 
     def get_query(self):
         return Event.query(self.session).order_by(
-            Event.block_id.desc()
+            Event.block_id.desc(), Event.event_idx.desc()
         )
 
+    def get_total(self, query, params):
+
+        if not has_filters(params, ['search_index', 'module_id', 'event_id']):
+            # Every extrinsic emits exactly one of the excluded ExtrinsicSuccess and ExtrinsicFailed events
+            return get_counter_total(self, lambda block_total: block_total.total_events - block_total.total_extrinsics)
+
+        return self.get_cached_count(query, params), False
+
 
 class EventDetailResource(JSONAPIDetailResource):
 
     def get_item_url_name(self):
         return 'event_id'
 
+    def get_item_block_id(self, item_id):
+        if len(item_id.split('-')) == 2 and item_id.split('-')[0].isnumeric():
+            return int(item_id.split('-')[0])
+
     def get_item(self, item_id):
         if len(item_id.split('-')) != 2:
             return None
@@ -375,11 +593,9 @@ class EventDetailResource(JSONAPIDetailResource):
     def serialize_item(self, item):
         data = item.serialize()
 
-        runtime_event = RuntimeEvent.query(self.session).filter_by(
-            module_id=item.module_id,
-            event_id=item.event_id,
-            spec_version=item.spec_version_id
-        ).first()
+        runtime_event = self.runtime_registry.get_event(
+            self.session, item.spec_version_id, item.module_id, item.event_id
+        )
 
         data['attributes']['documentation'] = runtime_event.documentation
 
@@ -396,6 +612,10 @@ class LogListResource(JSONAPIListResource):
 
 class LogDetailResource(JSONAPIDetailResource):
 
+    def get_item_block_id(self, item_id):
+        if len(item_id.split('-')) == 2 and item_id.split('-')[0].isnumeric():
+            return int(item_id.split('-')[0])
+
     def get_item(self, item_id):
         if len(item_id.split('-')) != 2:
             return None
@@ -406,60 +626,55 @@ class NetworkStatisticsResource(JSONAPIResource):
 
     cache_expiration_time = 6
 
-    def on_get(self, req, resp, network_id=None):
-        resp.status = falcon.HTTP_200
-
-        # TODO make caching more generic for custom resources
-
-        cache_key = '{}-{}'.format(req.method, req.url)
-
-        response = self.cache_region.get(cache_key, self.cache_expiration_time)
-
-        if response is NO_VALUE:
-
-            best_block = BlockTotal.query(self.session).filter_by(id=self.session.query(func.max(BlockTotal.id)).one()[0]).first()
-            if best_block:
-                response = self.get_jsonapi_response(
-                    data={
-                        'type': 'networkstats',
-                        'id': network_id,
-                        'attributes': {
-                            'best_block': best_block.id,
-                            'total_signed_extrinsics': int(best_block.total_extrinsics_signed),
-                            'total_events': int(best_block.total_events),
-                            'total_events_module': int(best_block.total_events_module),
-                            'total_blocks': 'N/A',
-                            'total_accounts': int(best_block.total_accounts),
-                            'total_runtimes': Runtime.query(self.session).count()
-                        }
-                    },
-                )
-            else:
-                response = self.get_jsonapi_response(
-                    data={
-                        'type': 'networkstats',
-                        'id': network_id,
-                        'attributes': {
-                            'best_block': 0,
-                            'total_signed_extrinsics': 0,
-                            'total_events': 0,
-                            'total_events_module': 0,
-                            'total_blocks': 'N/A',
-                            'total_accounts': 0,
-                            'total_runtimes': 0
-                        }
-                    },
-                )
-            self.cache_region.set(cache_key, response)
-            resp.set_header('X-Cache', 'MISS')
+    def process_get_response(self, req, resp, network_id=None):
+        # Served from the shared head record, published by the scheduler on every finalized block
+        head = self.chain_head.get(self.session)
+
+        if head.get('block_total_id') is None:
+            # Totals are only part of a head published by the scheduler
+            head = ChainHead.query(self.session)
+
+        block_total = head.get('block_total')
+
+        if block_total:
+            attributes = {
+                'best_block': head['block_total_id'],
+                'total_signed_extrinsics': block_total['total_extrinsics_signed'],
+                'total_events': block_total['total_events'],
+                'total_events_module': block_total['total_events_module'],
+                'total_blocks': 'N/A',
+                'total_accounts': block_total['total_accounts'],
+                'total_runtimes': head['runtime_count']
+            }
         else:
-            resp.set_header('X-Cache', 'HIT')
+            attributes = {
+                'best_block': 0,
+                'total_signed_extrinsics': 0,
+                'total_events': 0,
+                'total_events_module': 0,
+                'total_blocks': 'N/A',
+                'total_accounts': 0,
+                'total_runtimes': 0
+            }
 
-        resp.media = response
+        return {
+            'status': falcon.HTTP_200,
+            'media': self.get_jsonapi_response(
+                data={
+                    'type': 'networkstats',
+                    'id': network_id,
+                    'attributes': attributes
+                }
+            ),
+            'cacheable': True
+        }
 
 
 class BalanceTransferListResource(JSONAPIListResource):
 
+    # Rows are serialized as balancetransfer from the event columns, regardless of fields[event]
+    sparse_columns = False
+
     def get_query(self):
         return Event.query(self.session).filter(
             Event.module_id == 'balances', Event.event_id == 'Transfer'
@@ -476,53 +691,35 @@ class BalanceTransferListResource(JSONAPIListResource):
                 except ValueError:
                     return query.filter(False)
 
-            search_index = SearchIndex.query(self.session).filter(
-                SearchIndex.index_type_id.in_([
+            query = Event.query(self.session).filter(search_index_filter(
+                (Event.block_id, Event.event_idx),
+                [SearchIndex.block_id, SearchIndex.event_idx],
+                [
                     settings.SEARCH_INDEX_BALANCETRANSFER,
                     settings.SEARCH_INDEX_CLAIMS_CLAIMED,
                     settings.SEARCH_INDEX_BALANCES_DEPOSIT,
                     settings.SEARCH_INDEX_STAKING_REWARD
-                ]),
-                SearchIndex.account_id == account_id
-            ).order_by(SearchIndex.sorting_value.desc())
-
-            query = Event.query(self.session).filter(tuple_(Event.block_id, Event.event_idx).in_(
-                [[s.block_id, s.event_idx] for s in search_index]
+                ],
+                account_id
             )).order_by(Event.block_id.desc())
 
-
         return query
 
-    def serialize_item(self, item):
+    def serialize_items(self, items, exclude=None):
+        # Accounts of the whole page in one query
+        accounts = get_transfer_accounts(self.session, items)
+        return [self.serialize_item(item, accounts=accounts) for item in items]
+
+    def serialize_item(self, item, exclude=None, accounts=None):
 
         if item.event_id == 'Transfer':
-            sender = Account.query(self.session).get(item.attributes[0].replace('0x', ''))
 
-            if sender:
-                sender_data = sender.serialize()
-            else:
-                sender_data = {
-                    'type': 'account',
-                    'id': item.attributes[0].replace('0x', ''),
-                    'attributes': {
-                        'id': item.attributes[0].replace('0x', ''),
-                        'address': ss58_encode(item.attributes[0].replace('0x', ''), settings.SUBSTRATE_ADDRESS_TYPE)
-                    }
-                }
+            if accounts is None:
+                accounts = get_transfer_accounts(self.session, [item])
 
-            destination = Account.query(self.session).get(item.attributes[1].replace('0x', ''))
+            sender_data = serialize_transfer_account(accounts, item.attributes[0])
+            destination_data = serialize_transfer_account(accounts, item.attributes[1])
 
-            if destination:
-                destination_data = destination.serialize()
-            else:
-                destination_data = {
-                    'type': 'account',
-                    'id': item.attributes[1].replace('0x', ''),
-                    'attributes': {
-                        'id': item.attributes[1].replace('0x', ''),
-                        'address': ss58_encode(item.attributes[1].replace('0x', ''), settings.SUBSTRATE_ADDRESS_TYPE)
-                    }
-                }
             # Some networks don't have fees
             if len(item.attributes) == 4:
                 fee = item.attributes[3]
@@ -576,33 +773,10 @@ class BalanceTransferDetailResource(JSONAPIDetailResource):
         return Event.query(self.session).get(item_id.split('-'))
 
     def serialize_item(self, item):
-        sender = Account.query(self.session).get(item.attributes[0].replace('0x', ''))
+        accounts = get_transfer_accounts(self.session, [item])
 
-        if sender:
-            sender_data = sender.serialize()
-        else:
-            sender_data = {
-                'type': 'account',
-                'id': item.attributes[0].replace('0x', ''),
-                'attributes': {
-                    'id': item.attributes[0].replace('0x', ''),
-                    'address': ss58_encode(item.attributes[0].replace('0x', ''), settings.SUBSTRATE_ADDRESS_TYPE)
-                }
-            }
-
-        destination = Account.query(self.session).get(item.attributes[1].replace('0x', ''))
-
-        if destination:
-            destination_data = destination.serialize()
-        else:
-            destination_data = {
-                'type': 'account',
-                'id': item.attributes[1].replace('0x', ''),
-                'attributes': {
-                    'id': item.attributes[1].replace('0x', ''),
-                    'address': ss58_encode(item.attributes[1].replace('0x', ''), settings.SUBSTRATE_ADDRESS_TYPE)
-                }
-            }
+        sender_data = serialize_transfer_account(accounts, item.attributes[0])
+        destination_data = serialize_transfer_account(accounts, item.attributes[1])
 
         # Some networks don't have fees
         if len(item.attributes) == 4:
@@ -631,6 +805,13 @@ class AccountResource(JSONAPIListResource):
             Account.balance_total.desc()
         )
 
+    def get_total(self, query, params):
+
+        if not any(key.startswith('filter[') and value for key, value in params.items()):
+            return get_counter_total(self, lambda block_total: block_total.total_accounts)
+
+        return self.get_cached_count(query, params), False
+
     def apply_filters(self, query, params):
 
         if params.get('filter[is_validator]'):
@@ -713,25 +894,83 @@ class AccountDetailResource(JSONAPIDetailResource):
 
         return relationships
 
+    def get_balance_history(self, account_id, points):
+        """ Total balance over the full history of the account, downsampled in the database to the last
+        snapshot in each of `points` equally sized block ranges
+        :param account_id: account id
+        :param points: maximum number of points
+        :returns: list of [block_id, balance]
+        """
+        min_block_id, max_block_id = self.session.query(
+            func.min(AccountInfoSnapshot.block_id), func.max(AccountInfoSnapshot.block_id)
+        ).filter(AccountInfoSnapshot.account_id == account_id).one()
+
+        if min_block_id is None:
+            return []
+
+        bucket_size = max(1, -(-(max_block_id - min_block_id + 1) // points))
+
+        bucket_block_ids = self.session.query(func.max(AccountInfoSnapshot.block_id)).filter(
+            AccountInfoSnapshot.account_id == account_id
+        ).group_by(func.floor((AccountInfoSnapshot.block_id - min_block_id) / bucket_size))
+
+        account_info_snapshot = self.session.query(
+            AccountInfoSnapshot.block_id, AccountInfoSnapshot.balance_total
+        ).filter(
+            AccountInfoSnapshot.account_id == account_id,
+            AccountInfoSnapshot.block_id.in_(bucket_block_ids)
+        ).order_by(AccountInfoSnapshot.block_id)
+
+        return [
+            [block_id, float((balance_total or 0) / 10**settings.SUBSTRATE_TOKEN_DECIMALS)]
+            for block_id, balance_total in account_info_snapshot
+        ]
+
+    @staticmethod
+    def get_balance_history_points(params):
+        """ Requested number of balance history points, limited to MAX_BALANCE_HISTORY_POINTS """
+        try:
+            points = int(params.get('balance_history_points', settings.BALANCE_HISTORY_POINTS))
+        except (TypeError, ValueError):
+            raise falcon.HTTPBadRequest('Invalid balance_history_points', 'balance_history_points must be a number')
+
+        if points < 1:
+            raise falcon.HTTPBadRequest('Invalid balance_history_points', 'balance_history_points must be positive')
+
+        return min(points, settings.MAX_BALANCE_HISTORY_POINTS)
+
+    def process_get_response(self, req, resp, **kwargs):
+        points = self.get_balance_history_points(req.params)
+        response = super(AccountDetailResource, self).process_get_response(req, resp, **kwargs)
+
+        fields = self.get_sparse_fields(req.params, 'account')
+
+        if response['status'] == falcon.HTTP_200 and (fields is None or 'balance_history' in fields):
+            account_id = response['media']['data']['id']
+            head = self.chain_head.get(self.session)
+
+            # Snapshots only change with new blocks, so the series is versioned by the head
+            value, cache_tier = self.response_cache.get_or_create(
+                'balance_history:{}:{}'.format(account_id, points),
+                lambda: {'balance_history': self.get_balance_history(account_id, points)},
+                settings.DOGPILE_CACHE_SETTINGS['head_versioned_cache_expiration_time'],
+                version=head.get('block_id')
+            )
+            balance_history = value['balance_history']
+
+            response['media']['data']['attributes']['balance_history'] = [
+                {
+                    'name': "Total balance",
+                    'type': 'line',
+                    'data': balance_history,
+                }
+            ]
+
+        return response
+
     def serialize_item(self, item):
         data = item.serialize()
 
-        # Get balance history
-        account_info_snapshot = AccountInfoSnapshot.query(self.session).filter_by(
-            account_id=item.id
-        ).order_by(AccountInfoSnapshot.block_id.desc())[:1000]
-
-        data['attributes']['balance_history'] = [
-            {
-                'name': "Total balance",
-                'type': 'line',
-                'data': [
-                    [item.block_id, float((item.balance_total or 0) / 10**settings.SUBSTRATE_TOKEN_DECIMALS)]
-                    for item in reversed(account_info_snapshot)
-                ],
-            }
-        ]
-
         if settings.USE_NODE_RETRIEVE_BALANCES == 'True':
 
             substrate = SubstrateInterface(
@@ -995,25 +1234,23 @@ class ContractDetailResource(JSONAPIDetailResource):
 class RuntimeListResource(JSONAPIListResource):
 
     cache_expiration_time = 60
+    cache_head_versioned = False
 
     def get_query(self):
-        return Runtime.query(self.session).order_by(
-            Runtime.id.desc()
-        )
+        return self.runtime_registry.get_runtimes(self.session)
 
 
 class RuntimeDetailResource(JSONAPIDetailResource):
 
     def get_item(self, item_id):
-        return Runtime.query(self.session).get(item_id)
+        if item_id.isnumeric():
+            return self.runtime_registry.get_runtime(self.session, int(item_id))
 
     def get_relationships(self, include_list, item):
         relationships = {}
 
         if 'modules' in include_list:
-            relationships['modules'] = RuntimeModule.query(self.session).filter_by(
-                spec_version=item.spec_version
-            ).order_by('lookup', 'id')
+            relationships['modules'] = self.runtime_registry.get_spec(self.session, item.spec_version).modules
 
         if 'types' in include_list:
             relationships['types'] = RuntimeType.query(self.session).filter_by(
@@ -1026,14 +1263,13 @@ class RuntimeDetailResource(JSONAPIDetailResource):
 class RuntimeCallListResource(JSONAPIListResource):
 
     cache_expiration_time = 3600
+    cache_head_versioned = False
 
     def apply_filters(self, query, params):
 
         if params.get('filter[latestRuntime]'):
 
-            latest_runtime = Runtime.query(self.session).order_by(Runtime.spec_version.desc()).first()
-
-            query = query.filter_by(spec_version=latest_runtime.spec_version)
+            query = query.filter_by(spec_version=self.runtime_registry.get_latest_spec_version(self.session))
 
         if params.get('filter[module_id]'):
 
@@ -1058,11 +1294,9 @@ class RuntimeCallDetailResource(JSONAPIDetailResource):
             return None
 
         spec_version, module_id, call_id = item_id.split('-')
-        return RuntimeCall.query(self.session).filter_by(
-            spec_version=spec_version,
-            module_id=module_id,
-            call_id=call_id
-        ).first()
+
+        if spec_version.isnumeric():
+            return self.runtime_registry.get_call(self.session, spec_version, module_id, call_id)
 
     def get_relationships(self, include_list, item):
         relationships = {}
@@ -1081,14 +1315,13 @@ class RuntimeCallDetailResource(JSONAPIDetailResource):
 class RuntimeEventListResource(JSONAPIListResource):
 
     cache_expiration_time = 3600
+    cache_head_versioned = False
 
     def apply_filters(self, query, params):
 
         if params.get('filter[latestRuntime]'):
 
-            latest_runtime = Runtime.query(self.session).order_by(Runtime.spec_version.desc()).first()
-
-            query = query.filter_by(spec_version=latest_runtime.spec_version)
+            query = query.filter_by(spec_version=self.runtime_registry.get_latest_spec_version(self.session))
 
         if params.get('filter[module_id]'):
 
@@ -1113,11 +1346,9 @@ class RuntimeEventDetailResource(JSONAPIDetailResource):
             return None
 
         spec_version, module_id, event_id = item_id.split('-')
-        return RuntimeEvent.query(self.session).filter_by(
-            spec_version=spec_version,
-            module_id=module_id,
-            event_id=event_id
-        ).first()
+
+        if spec_version.isnumeric():
+            return self.runtime_registry.get_event(self.session, spec_version, module_id, event_id)
 
     def get_relationships(self, include_list, item):
         relationships = {}
@@ -1136,6 +1367,7 @@ class RuntimeEventDetailResource(JSONAPIDetailResource):
 class RuntimeTypeListResource(JSONAPIListResource):
 
     cache_expiration_time = 3600
+    cache_head_versioned = False
 
     def get_query(self):
         return RuntimeType.query(self.session).order_by(
@@ -1146,9 +1378,7 @@ class RuntimeTypeListResource(JSONAPIListResource):
 
         if params.get('filter[latestRuntime]'):
 
-            latest_runtime = Runtime.query(self.session).order_by(Runtime.spec_version.desc()).first()
-
-            query = query.filter_by(spec_version=latest_runtime.spec_version)
+            query = query.filter_by(spec_version=self.runtime_registry.get_latest_spec_version(self.session))
 
         return query
 
@@ -1156,6 +1386,7 @@ class RuntimeTypeListResource(JSONAPIListResource):
 class RuntimeModuleListResource(JSONAPIListResource):
 
     cache_expiration_time = 3600
+    cache_head_versioned = False
 
     def get_query(self):
         return RuntimeModule.query(self.session).order_by(
@@ -1166,9 +1397,7 @@ class RuntimeModuleListResource(JSONAPIListResource):
 
         if params.get('filter[latestRuntime]'):
 
-            latest_runtime = Runtime.query(self.session).order_by(Runtime.spec_version.desc()).first()
-
-            query = query.filter_by(spec_version=latest_runtime.spec_version)
+            query = query.filter_by(spec_version=self.runtime_registry.get_latest_spec_version(self.session))
 
         return query
 
@@ -1181,35 +1410,18 @@ class RuntimeModuleDetailResource(JSONAPIDetailResource):
             return None
 
         spec_version, module_id = item_id.split('-')
-        return RuntimeModule.query(self.session).filter_by(spec_version=spec_version, module_id=module_id).first()
+
+        if spec_version.isnumeric():
+            return self.runtime_registry.get_module(self.session, spec_version, module_id)
 
     def get_relationships(self, include_list, item):
         relationships = {}
+        spec = self.runtime_registry.get_spec(self.session, item.spec_version)
 
-        if 'calls' in include_list:
-            relationships['calls'] = RuntimeCall.query(self.session).filter_by(
-                spec_version=item.spec_version, module_id=item.module_id).order_by(
-                'lookup', 'id')
-
-        if 'events' in include_list:
-            relationships['events'] = RuntimeEvent.query(self.session).filter_by(
-                spec_version=item.spec_version, module_id=item.module_id).order_by(
-                'lookup', 'id')
-
-        if 'storage' in include_list:
-            relationships['storage'] = RuntimeStorage.query(self.session).filter_by(
-                spec_version=item.spec_version, module_id=item.module_id).order_by(
-                'name')
-
-        if 'constants' in include_list:
-            relationships['constants'] = RuntimeConstant.query(self.session).filter_by(
-                spec_version=item.spec_version, module_id=item.module_id).order_by(
-                'name')
-
-        if 'errors' in include_list:
-            relationships['errors'] = RuntimeErrorMessage.query(self.session).filter_by(
-                spec_version=item.spec_version, module_id=item.module_id).order_by(
-                'name').order_by(RuntimeErrorMessage.index)
+        for name, items in [('calls', spec.calls), ('events', spec.events), ('storage', spec.storage),
+                            ('constants', spec.constants), ('errors', spec.errors)]:
+            if name in include_list:
+                relationships[name] = spec.get_module_items(items, item.module_id)
 
         return relationships
 
@@ -1222,16 +1434,15 @@ class RuntimeStorageDetailResource(JSONAPIDetailResource):
             return None
 
         spec_version, module_id, name = item_id.split('-')
-        return RuntimeStorage.query(self.session).filter_by(
-            spec_version=spec_version,
-            module_id=module_id,
-            name=name
-        ).first()
+
+        if spec_version.isnumeric():
+            return self.runtime_registry.get_storage(self.session, spec_version, module_id, name)
 
 
 class RuntimeConstantListResource(JSONAPIListResource):
 
     cache_expiration_time = 3600
+    cache_head_versioned = False
 
     def get_query(self):
         return RuntimeConstant.query(self.session).order_by(
@@ -1247,8 +1458,6 @@ class RuntimeConstantDetailResource(JSONAPIDetailResource):
             return None
 
         spec_version, module_id, name = item_id.split('-')
-        return RuntimeConstant.query(self.session).filter_by(
-            spec_version=spec_version,
-            module_id=module_id,
-            name=name
-        ).first()
+
+        if spec_version.isnumeric():
+            return self.runtime_registry.get_constant(self.session, spec_version, module_id, name)
@@ -1,4 +1,5 @@
 import logging
+import threading
 import time
 
 from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
@@ -7,9 +8,13 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 from app.resources.base import create_substrate
+from app.tasks.block_gaps import BlockGapTask
+from app.tasks.cache_warming import CacheWarmingTask
 from app.tasks.chain_data import ChainDataTask
-from app.tasks.chart import AresChartTask
+from app.tasks.chain_head import ChainHeadTask
+from app.tasks.chain_metrics import ChainMetricRollupTask
 from app.tasks.reward import RequestRewardTask
+from app.tasks.symbol_rollup import SymbolPriceRollupTask
 from app.tasks.symbols import SymbolsPriceTask
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -21,14 +26,23 @@ if __name__ == '__main__':
 
     scheduler = BackgroundScheduler(jobstores=jobstores, executors=executors, job_defaults=job_defaults)
     scheduler.start()
-    ares_chart = AresChartTask()
+    chain_metric_rollup = ChainMetricRollupTask()
+    block_gaps = BlockGapTask()
     request_reward = RequestRewardTask()
     symbols_price = SymbolsPriceTask()
+    symbol_price_rollup = SymbolPriceRollupTask()
     chain_data = ChainDataTask()
+    chain_head = ChainHeadTask()
+    cache_warming = CacheWarmingTask()
     substrate = create_substrate()
 
 
     def subscription_handler(new_block, update_nr, subscription_id):
+        # Publish new head, expires cached lists and marks blocks up to the finalized head immutable
+        chain_head.finalized_block_id = new_block['header']['number']
+        chain_head.run()
+        threading.Thread(target=cache_warming.run, daemon=True).start()
+
         events = substrate.get_events(block_hash=new_block['header']['parentHash'])
         for event in events:
             event = event.value
@@ -38,15 +52,18 @@ if __name__ == '__main__':
                 break
 
 
-    ares_chart.run()
+    # Rollups and the gap scan are not run here, their backfill runs in bounded batches in the scheduled jobs so
+    # the head subscription starts right away
     request_reward.run()
     symbols_price.run()
     chain_data.run()
+    cache_warming.run()
     scheduler.add_job(
-        ares_chart.run,
-        trigger=CronTrigger(year="*", month="*", day="*", hour="*/6", minute="50", second="0"),
+        chain_metric_rollup.run,
+        trigger=CronTrigger(year="*", month="*", day="*", hour="*", minute="*", second="40"),
         # args=[],
-        name="ares_chart",
+        name="chain metric rollup",
+        max_instances=1
     )
     time.sleep(1)
     scheduler.add_job(
@@ -63,6 +80,22 @@ if __name__ == '__main__':
         name="symbols price",
     )
     time.sleep(1)
+    scheduler.add_job(
+        symbol_price_rollup.run,
+        trigger=CronTrigger(year="*", month="*", day="*", hour="*", minute="*", second="20"),
+        # args=[],
+        name="symbol price rollup",
+        max_instances=1
+    )
+    time.sleep(1)
+    scheduler.add_job(
+        block_gaps.run,
+        trigger=CronTrigger(year="*", month="*", day="*", hour="*", minute="*", second="50"),
+        # args=[],
+        name="block gaps",
+        max_instances=1
+    )
+    time.sleep(1)
     scheduler.add_job(
         chain_data.run,
         trigger=CronTrigger(year="*", month="*", day="*", hour="*", minute="30", second="0"),
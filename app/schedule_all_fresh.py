@@ -2,7 +2,7 @@ import logging
 import time
 
 from app.tasks.chain_data import ChainDataTask
-from app.tasks.chart import AresChartTask
+from app.tasks.chain_metrics import ChainMetricRollupTask
 from app.tasks.reward import RequestRewardTask
 from app.tasks.symbols import SymbolsPriceTask
 
@@ -10,13 +10,13 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 
 if __name__ == '__main__':
 
-    ares_chart = AresChartTask()
+    chain_metric_rollup = ChainMetricRollupTask()
     request_reward = RequestRewardTask()
     symbols_price = SymbolsPriceTask()
     chain_data = ChainDataTask()
 
-    print("RUN ares_chart")
-    ares_chart.run()
+    print("RUN chain_metric_rollup")
+    chain_metric_rollup.run()
     time.sleep(5)
 
     # print("RUN request_reward")
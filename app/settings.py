@@ -29,6 +29,17 @@ DB_CONNECTION = os.environ.get("DB_CONNECTION", "mysql+mysqlconnector://{}:{}@{}
     DB_USERNAME, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
 ))
 
+# Comma separated connection strings of read replicas, read-only requests are spread over them
+DB_REPLICA_CONNECTIONS = [
+    connection.strip() for connection in os.environ.get("DB_REPLICA_CONNECTIONS", "").split(",") if connection.strip()
+]
+# Either round_robin or least_connections
+DB_REPLICA_SELECTION = os.environ.get("DB_REPLICA_SELECTION", "round_robin")
+# Replicas trailing the primary by more blocks are skipped
+DB_REPLICA_MAX_LAG = int(os.environ.get("DB_REPLICA_MAX_LAG", 10))
+# Seconds between replica lag checks
+DB_REPLICA_LAG_CHECK_INTERVAL = int(os.environ.get("DB_REPLICA_LAG_CHECK_INTERVAL", 10))
+
 SUBSTRATE_RPC_URL = os.environ.get("SUBSTRATE_RPC_URL", "http://substrate-node:9933/")
 SUBSTRATE_ADDRESS_TYPE = int(os.environ.get("SUBSTRATE_ADDRESS_TYPE", 42))
 SUBSTRATE_TOKEN_DECIMALS = int(os.environ.get("SUBSTRATE_TOKEN_DECIMALS", 12))
@@ -40,15 +51,74 @@ DOGPILE_CACHE_SETTINGS = {
 
     'default_list_cache_expiration_time': 6,
     'default_detail_cache_expiration_time': 3600,
+    'head_versioned_cache_expiration_time': 600,
+    'not_found_cache_expiration_time': 30,
+    'count_cache_expiration_time': 300,
+    'immutable_cache_expiration_time': int(os.environ.get("IMMUTABLE_CACHE_EXPIRATION_TIME", 60 * 60 * 24)),
+    'redis_expiration_time': int(os.environ.get("DOGPILE_CACHE_REDIS_EXPIRATION_TIME", 60 * 60 * 24)),
+    'chain_head_expiration_time': 1,
+    # A published head older than this is treated as missing, so a stopped scheduler does not freeze it
+    'chain_head_max_age': int(os.environ.get("CHAIN_HEAD_MAX_AGE", 60)),
+    # Cached bodies of at least this size are also stored gzip compressed, 0 disables compression
+    'compress_min_size': int(os.environ.get("CACHE_COMPRESS_MIN_SIZE", 1400)),
+    'compress_level': 6,
+    'local_cache_max_size': int(os.environ.get("LOCAL_CACHE_MAX_SIZE", 1024)),
+    'local_cache_expiration_time': int(os.environ.get("LOCAL_CACHE_EXPIRATION_TIME", 3)),
+    # Seconds an expired local entry is still served while redis is unavailable
+    'local_cache_stale_time': int(os.environ.get("LOCAL_CACHE_STALE_TIME", 30)),
+    'socket_timeout': float(os.environ.get("DOGPILE_CACHE_SOCKET_TIMEOUT", 0.5)),
+    # Seconds a worker serves from its local cache only after a redis error, before trying redis again
+    'retry_interval': int(os.environ.get("DOGPILE_CACHE_RETRY_INTERVAL", 5)),
+    'lock_timeout': int(os.environ.get("DOGPILE_CACHE_LOCK_TIMEOUT", 60)),
+    'lock_wait_time': float(os.environ.get("DOGPILE_CACHE_LOCK_WAIT_TIME", 10)),
+    'lock_sleep': 0.1,
     'host': os.environ.get("DOGPILE_CACHE_HOST", "redis"),
     'port': os.environ.get("DOGPILE_CACHE_PORT", 6379),
     'db': os.environ.get("DOGPILE_CACHE_DB", 10)
 }
 
 
+# Routes rendered by the scheduler at startup and on each finalized block to populate the response cache
+CACHE_WARMING_PAGES = int(os.environ.get("CACHE_WARMING_PAGES", 3))
+CACHE_WARMING_PAGE_SIZE = int(os.environ.get("CACHE_WARMING_PAGE_SIZE", 25))
+CACHE_WARMING_PAGED_ROUTES = os.environ.get(
+    "CACHE_WARMING_PAGED_ROUTES", "/block,/extrinsic,/event,/balances/transfer"
+).split(",")
+CACHE_WARMING_ROUTES = os.environ.get(
+    "CACHE_WARMING_ROUTES",
+    "/networkstats/{},/runtime,/runtime-module?filter[latestRuntime]=1,/runtime-call?filter[latestRuntime]=1,"
+    "/runtime-event?filter[latestRuntime]=1,/runtime-type?filter[latestRuntime]=1,/runtime-constant".format(
+        os.environ.get("NETWORK_ID", "ares")
+    )
+).split(",")
+
+# Seconds between checks for new runtimes by the per-process runtime metadata registry
+RUNTIME_REGISTRY_REFRESH_INTERVAL = int(os.environ.get("RUNTIME_REGISTRY_REFRESH_INTERVAL", 60))
+
 DEBUG = False
 
 MAX_RESOURCE_PAGE_SIZE = 100
+# Default and maximum number of points of the downsampled account balance history
+BALANCE_HISTORY_POINTS = int(os.environ.get("BALANCE_HISTORY_POINTS", 1000))
+MAX_BALANCE_HISTORY_POINTS = 5000
+# Maximum number of buckets of an oracle price series
+MAX_PRICE_BUCKETS = int(os.environ.get("MAX_PRICE_BUCKETS", 1000))
+# Number of symbol snapshots added to the price rollup tables per transaction
+SYMBOL_PRICE_ROLLUP_BATCH_SIZE = int(os.environ.get("SYMBOL_PRICE_ROLLUP_BATCH_SIZE", 10000))
+# Number of blocks added to the chain metric rollup table per transaction
+CHAIN_METRIC_ROLLUP_BATCH_SIZE = int(os.environ.get("CHAIN_METRIC_ROLLUP_BATCH_SIZE", 10000))
+# Seconds a rollup or gap scan run keeps processing batches, a backfill continues in the next scheduled runs
+BATCH_TASK_MAX_RUN_TIME = int(os.environ.get("BATCH_TASK_MAX_RUN_TIME", 45))
+# Number of blocks checked for gaps per transaction
+BLOCK_GAP_SCAN_BATCH_SIZE = int(os.environ.get("BLOCK_GAP_SCAN_BATCH_SIZE", 100000))
+# Threads loading relationships of a detail resource in parallel
+RELATIONSHIP_LOADER_WORKERS = int(os.environ.get("RELATIONSHIP_LOADER_WORKERS", 4))
+# Maximum number of intervals of a chart series
+MAX_CHART_POINTS = int(os.environ.get("MAX_CHART_POINTS", 1000))
+# Deeper pages are only available with cursor paging, as large OFFSETs scan all skipped rows
+MAX_RESOURCE_PAGE_OFFSET = int(os.environ.get("MAX_RESOURCE_PAGE_OFFSET", 10000))
+# Totals of filtered lists are counted up to this number of rows and reported as "<n>+" beyond it
+MAX_RESOURCE_COUNT = int(os.environ.get("MAX_RESOURCE_COUNT", 10000))
 LOG_TYPE_AUTHORITIESCHANGE = 1
 
 SEARCH_INDEX_SLASHED_ACCOUNT = 1
@@ -0,0 +1,131 @@
+import time
+
+from sqlalchemy import func
+from sqlalchemy.orm import scoped_session, Session
+
+from app.main import session_factory
+from app.models.base import BaseModel
+from app.models.data import Block, BlockGap, BlockGapScan
+from app.settings import BLOCK_GAP_SCAN_BATCH_SIZE, BATCH_TASK_MAX_RUN_TIME
+from app.tasks.base import BaseTask
+
+
+def find_gaps(block_ids, block_from, block_to):
+    """ Missing ranges in a range of blocks
+    :param block_ids: ordered ids of the harvested blocks in the range
+    :param block_from: first block of the range
+    :param block_to: last block of the range
+    :returns: list of (from, to) tuples
+    """
+    gaps = []
+    expected = block_from
+
+    for block_id in block_ids:
+        if block_id > expected:
+            gaps.append((expected, block_id - 1))
+        expected = block_id + 1
+
+    if expected <= block_to:
+        gaps.append((expected, block_to))
+
+    return gaps
+
+
+class BlockGapTask(BaseTask):
+    """ Maintains the missing block ranges: scans blocks after the watermark and re-checks known gaps, which can
+    be filled by the harvester later on
+    """
+    session: 'Session'
+    tables_created = False
+
+    def before(self):
+        _scoped_session = scoped_session(session_factory)
+        self.session = _scoped_session()
+
+        if not self.tables_created:
+            BaseModel.metadata.create_all(
+                self.session.get_bind(), tables=[BlockGap.__table__, BlockGapScan.__table__]
+            )
+            self.tables_created = True
+
+    def after(self):
+        if self.session:
+            self.session.close()
+        self.session = None
+
+    def post(self):
+        deadline = time.time() + BATCH_TASK_MAX_RUN_TIME
+
+        self.update_gaps()
+
+        while self.scan_batch() and time.time() < deadline:
+            pass
+
+    def update_gaps(self):
+        """ Shrinks the known gaps by the blocks harvested in them since the last run. Each gap is checked from
+        its lowest harvested block onwards, at most BLOCK_GAP_SCAN_BATCH_SIZE blocks per run over all gaps; the
+        part of a gap after that is checked again in a next run
+        """
+        budget = BLOCK_GAP_SCAN_BATCH_SIZE
+
+        for gap in BlockGap.query(self.session).order_by(BlockGap.block_from).all():
+            if budget <= 0:
+                break
+
+            first_block_id = self.session.query(func.min(Block.id)).filter(
+                Block.id >= gap.block_from, Block.id <= gap.block_to
+            ).scalar()
+
+            if first_block_id is None:
+                continue
+
+            block_ids = [row[0] for row in self.session.query(Block.id).filter(
+                Block.id >= first_block_id, Block.id <= gap.block_to
+            ).order_by(Block.id).limit(budget)]
+
+            budget -= len(block_ids)
+
+            if budget > 0:
+                checked_up_to = gap.block_to
+            else:
+                checked_up_to = block_ids[-1]
+
+            gaps = find_gaps(block_ids, gap.block_from, checked_up_to)
+
+            if checked_up_to < gap.block_to:
+                gaps.append((checked_up_to + 1, gap.block_to))
+
+            self.session.delete(gap)
+            self.session.flush()
+
+            for block_from, block_to in gaps:
+                self.session.add(BlockGap(block_from=block_from, block_to=block_to))
+
+        self.session.commit()
+
+    def scan_batch(self):
+        """ Scans the next batch of blocks after the watermark
+        :returns: True when more blocks are waiting
+        """
+        scan = BlockGapScan.query(self.session).get(1)
+
+        if scan is None:
+            # Block numbering starts at 1 after genesis
+            scan = BlockGapScan(id=1, scanned_up_to=0)
+            self.session.add(scan)
+
+        block_ids = [row[0] for row in self.session.query(Block.id).filter(
+            Block.id > scan.scanned_up_to
+        ).order_by(Block.id).limit(BLOCK_GAP_SCAN_BATCH_SIZE)]
+
+        if not block_ids:
+            self.session.commit()
+            return False
+
+        for block_from, block_to in find_gaps(block_ids, scan.scanned_up_to + 1, block_ids[-1]):
+            self.session.add(BlockGap(block_from=block_from, block_to=block_to))
+
+        scan.scanned_up_to = block_ids[-1]
+        self.session.commit()
+
+        return len(block_ids) == BLOCK_GAP_SCAN_BATCH_SIZE
@@ -0,0 +1,43 @@
+import logging
+import threading
+
+from falcon import testing
+
+from app.main import app
+from app.settings import CACHE_WARMING_PAGES, CACHE_WARMING_PAGE_SIZE, CACHE_WARMING_PAGED_ROUTES, \
+    CACHE_WARMING_ROUTES
+from app.tasks.base import BaseTask
+
+
+class CacheWarmingTask(BaseTask):
+    """ Renders the hot routes through the application, so their responses are in the cache before users ask """
+
+    def __init__(self):
+        self.client = testing.TestClient(app)
+        self._running = threading.Lock()
+
+    def run(self):
+        # Skip when the previous run is still busy, the next block triggers a new one
+        if not self._running.acquire(False):
+            return
+
+        try:
+            super().run()
+        finally:
+            self._running.release()
+
+    def get_requests(self):
+        for route in CACHE_WARMING_PAGED_ROUTES:
+            for page in range(1, CACHE_WARMING_PAGES + 1):
+                yield route, 'page[number]={}&page[size]={}'.format(page, CACHE_WARMING_PAGE_SIZE)
+
+        for route in CACHE_WARMING_ROUTES:
+            path, _, query_string = route.partition('?')
+            yield path, query_string
+
+    def post(self):
+        for path, query_string in self.get_requests():
+            result = self.client.simulate_get(path, query_string=query_string)
+
+            if result.status_code != 200:
+                logging.warning("cache warming of {}?{} returned {}".format(path, query_string, result.status))
@@ -5,8 +5,8 @@ from substrateinterface import SubstrateInterface
 from sqlalchemy.orm import scoped_session, Session
 
 from app import utils
-from app.main import session_factory
-from app.models.data import BlockTotal, Block, PriceRequest
+from app.main import session_factory, chain_head
+from app.models.data import PriceRequest
 from app.resources.base import create_substrate
 from app.tasks.base import BaseTask
 
@@ -27,10 +27,15 @@ class ChainDataTask(BaseTask):
         self.session = None
 
     def post(self):
-        block_total: BlockTotal = BlockTotal.query(self.session).filter_by(
-            id=self.session.query(func.max(BlockTotal.id)).one()[0]).first()
-        block: Block = Block.query(self.session).filter_by(id=block_total.id).first()
-        block_hash = block.hash
+        # Latest block totals from the shared head record, published on every finalized block
+        head = chain_head.get(self.session)
+
+        if head.get('block_total_id') is None:
+            # Totals are only part of a head published by the scheduler
+            head = chain_head.query(self.session)
+
+        block_total = head['block_total']
+        block_hash = head['block_total_hash']
         substrate = self.substrate
         # block_hash = substrate.get_chain_finalised_head()
         substrate.init_runtime(block_hash=block_hash)
@@ -98,11 +103,12 @@ class ChainDataTask(BaseTask):
         # validators = [storage_key[-64:] for storage_key in rpc_result if len(storage_key) == 146]
         # total_validators = len(validator_keys)
         if block_total is None:
-            block_total = BlockTotal()
-            block_total.total_extrinsics_signed = 0
-            block_total.total_events_transfer = 0
-            block_total.total_accounts = 0
-            block_total.total_treasury_burn = 0
+            block_total = {
+                'total_extrinsics_signed': 0,
+                'total_events_transfer': 0,
+                'total_accounts': 0,
+                'total_treasury_burn': 0
+            }
 
         symbols = utils.query_storage(pallet_name='AresOracle', storage_name='PricesRequests',
                                       substrate=substrate,
@@ -110,10 +116,10 @@ class ChainDataTask(BaseTask):
         total_price_requests = self.session.query(func.count(PriceRequest.order_id)).scalar()
 
         resp = {
-            'total_extrinsics_signed': int(block_total.total_extrinsics_signed),
-            'total_events_transfer': int(block_total.total_events_transfer),
-            'total_account': int(block_total.total_accounts),
-            'total_treasury_burn': int(block_total.total_treasury_burn),
+            'total_extrinsics_signed': block_total['total_extrinsics_signed'],
+            'total_events_transfer': block_total.get('total_events_transfer', 0),
+            'total_account': block_total['total_accounts'],
+            'total_treasury_burn': block_total.get('total_treasury_burn', 0),
             'total_issuance': str(total_issuance),
             'finalized_block': finalized_block,
             'total_validators': int(total_validators),
@@ -0,0 +1,21 @@
+from sqlalchemy.orm import scoped_session, Session
+
+from app.main import session_factory, chain_head
+from app.tasks.base import BaseTask
+
+
+class ChainHeadTask(BaseTask):
+    session: 'Session'
+    finalized_block_id: int = None
+
+    def before(self):
+        _scoped_session = scoped_session(session_factory)
+        self.session = _scoped_session()
+
+    def after(self):
+        self.session.close()
+        self.session = None
+
+    def post(self):
+        # Shared with the application, so cache warming in this process renders for the new head right away
+        chain_head.set(chain_head.query(self.session, self.finalized_block_id))
@@ -0,0 +1,125 @@
+import time
+
+import pytz
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import scoped_session, Session
+
+from app.main import session_factory
+from app.models.base import BaseModel
+from app.models.data import Block, BlockTotal, Event, ChainMetricRollup
+from app.settings import CHAIN_METRIC_ROLLUP_BATCH_SIZE, BATCH_TASK_MAX_RUN_TIME
+from app.tasks.base import BaseTask
+from app.utils.chain_metrics import CHAIN_METRIC_INTERVALS, get_interval_start
+
+
+class ChainMetricRollupTask(BaseTask):
+    """ Adds the blocks after the watermark, the last rolled up block, to the chain metric rollup table """
+    session: 'Session'
+    table_created = False
+
+    def before(self):
+        _scoped_session = scoped_session(session_factory)
+        self.session = _scoped_session()
+
+        if not self.table_created:
+            BaseModel.metadata.create_all(self.session.get_bind(), tables=[ChainMetricRollup.__table__])
+            self.table_created = True
+
+    def after(self):
+        if self.session:
+            self.session.close()
+        self.session = None
+
+    def post(self):
+        deadline = time.time() + BATCH_TASK_MAX_RUN_TIME
+
+        while self.rollup_batch() and time.time() < deadline:
+            pass
+
+    def rollup_batch(self):
+        """ Rolls up the next batch of blocks, up to the last block with harvested totals
+        :returns: True when more blocks are waiting
+        """
+        # All intervals are updated in the same transaction, so any of them holds the watermark
+        watermark = self.session.query(func.max(ChainMetricRollup.last_block_id)).filter(
+            ChainMetricRollup.interval == 'hour'
+        ).scalar() or 0
+
+        # Totals are harvested in order, so blocks up to the last total have no gaps
+        last_total_id = self.session.query(func.max(BlockTotal.id)).scalar()
+
+        if last_total_id is None or last_total_id <= watermark:
+            return False
+
+        last_block_id = min(watermark + CHAIN_METRIC_ROLLUP_BATCH_SIZE, last_total_id)
+
+        blocks = self.session.query(
+            Block.id, Block.datetime, Block.count_accounts_new, Block.count_extrinsics_signed, Block.count_events,
+            BlockTotal.blocktime
+        ).join(BlockTotal, BlockTotal.id == Block.id).filter(
+            Block.id > watermark, Block.id <= last_block_id, Block.datetime.isnot(None)
+        ).order_by(Block.id).all()
+
+        if not blocks:
+            return False
+
+        transfers = dict(self.session.query(Event.block_id, func.count()).filter(
+            Event.block_id > watermark,
+            Event.block_id <= last_block_id,
+            Event.module_id == 'balances',
+            Event.event_id == 'Transfer'
+        ).group_by(Event.block_id))
+
+        for interval in CHAIN_METRIC_INTERVALS:
+            self.rollup(interval, blocks, transfers)
+
+        self.session.commit()
+
+        return last_block_id < last_total_id
+
+    def rollup(self, interval, blocks, transfers):
+        rows = {}
+
+        for block_id, datetime, accounts_new, extrinsics_signed, events, blocktime in blocks:
+            timestamp = get_interval_start(interval, int(datetime.replace(tzinfo=pytz.UTC).timestamp()))
+            rows.setdefault(timestamp, []).append(
+                (block_id, accounts_new, extrinsics_signed, events, blocktime, transfers.get(block_id, 0))
+            )
+
+        if not rows:
+            return
+
+        rollups = {
+            rollup.timestamp: rollup for rollup in ChainMetricRollup.query(self.session).filter(
+                tuple_(ChainMetricRollup.interval, ChainMetricRollup.timestamp).in_(
+                    [(interval, timestamp) for timestamp in rows]
+                )
+            )
+        }
+
+        for timestamp, interval_blocks in rows.items():
+            rollup = rollups.get(timestamp)
+
+            if rollup is None:
+                rollup = ChainMetricRollup(
+                    interval=interval,
+                    timestamp=timestamp,
+                    first_block_id=interval_blocks[0][0],
+                    blocks=0,
+                    blocktime=0,
+                    accounts_new=0,
+                    extrinsics_signed=0,
+                    events=0,
+                    transfers=0
+                )
+                self.session.add(rollup)
+
+            for block_id, accounts_new, extrinsics_signed, events, blocktime, block_transfers in interval_blocks:
+                rollup.blocks += 1
+                rollup.blocktime += blocktime
+                rollup.accounts_new += accounts_new
+                rollup.extrinsics_signed += extrinsics_signed
+                rollup.events += events
+                rollup.transfers += block_transfers
+
+            rollup.last_block_id = interval_blocks[-1][0]
@@ -0,0 +1,128 @@
+import time
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import scoped_session, Session
+
+from app.main import session_factory
+from app.models.base import BaseModel
+from app.models.data import BlockTotal, SymbolSnapshot, SymbolPriceMinute
+from app.settings import SYMBOL_PRICE_ROLLUP_BATCH_SIZE, BATCH_TASK_MAX_RUN_TIME
+from app.tasks.base import BaseTask
+from app.utils.prices import PRICE_ROLLUPS
+
+
+class SymbolPriceRollupTask(BaseTask):
+    """ Adds the symbol snapshots after the watermark, the last rolled up block, up to the last block with harvested
+    totals to the price rollup tables
+    """
+    session: 'Session'
+    tables_created = False
+
+    def before(self):
+        _scoped_session = scoped_session(session_factory)
+        self.session = _scoped_session()
+
+        if not self.tables_created:
+            BaseModel.metadata.create_all(
+                self.session.get_bind(), tables=[model.__table__ for model in PRICE_ROLLUPS.values()]
+            )
+            self.tables_created = True
+
+    def after(self):
+        if self.session:
+            self.session.close()
+        self.session = None
+
+    def post(self):
+        deadline = time.time() + BATCH_TASK_MAX_RUN_TIME
+
+        while self.rollup_batch() and time.time() < deadline:
+            pass
+
+    def get_watermark(self):
+        # All rollup tables are updated in the same transaction, so any of them holds the watermark
+        return self.session.query(func.max(SymbolPriceMinute.last_block_id)).scalar() or 0
+
+    def rollup_batch(self):
+        """ Rolls up the snapshots of the next batch of blocks
+        :returns: True when more snapshots are waiting
+        """
+        watermark = self.get_watermark()
+
+        # Totals are harvested in order, so blocks up to the last total have no gaps. Snapshots of blocks after
+        # it can still be backfilled below later snapshots and are left for a next run
+        last_total_id = self.session.query(func.max(BlockTotal.id)).scalar()
+
+        if last_total_id is None or last_total_id <= watermark:
+            return False
+
+        batch_filter = (
+            SymbolSnapshot.block_id > watermark,
+            SymbolSnapshot.block_id <= last_total_id,
+            SymbolSnapshot.price.isnot(None)
+        )
+
+        # Last block of the batch, the batch always holds all snapshots of a block
+        last_block_id = self.session.query(SymbolSnapshot.block_id).filter(*batch_filter).order_by(
+            SymbolSnapshot.block_id
+        ).offset(SYMBOL_PRICE_ROLLUP_BATCH_SIZE - 1).limit(1).scalar()
+
+        query = self.session.query(
+            SymbolSnapshot.symbol,
+            SymbolSnapshot.block_id,
+            func.unix_timestamp(SymbolSnapshot.created_at),
+            SymbolSnapshot.price / func.pow(10, SymbolSnapshot.fraction)
+        ).filter(*batch_filter)
+
+        if last_block_id is not None:
+            query = query.filter(SymbolSnapshot.block_id <= last_block_id)
+
+        snapshots = query.order_by(SymbolSnapshot.block_id).all()
+
+        if not snapshots:
+            return False
+
+        for model in PRICE_ROLLUPS.values():
+            self.rollup(model, snapshots)
+
+        self.session.commit()
+
+        return last_block_id is not None
+
+    def rollup(self, model, snapshots):
+        buckets = {}
+
+        for symbol, block_id, timestamp, price in snapshots:
+            timestamp = int(timestamp)
+            key = (symbol, timestamp - timestamp % model.bucket_seconds)
+            buckets.setdefault(key, []).append((block_id, float(price)))
+
+        rollups = {
+            (rollup.symbol, rollup.timestamp): rollup for rollup in model.query(self.session).filter(
+                tuple_(model.symbol, model.timestamp).in_(list(buckets.keys()))
+            )
+        }
+
+        for (symbol, timestamp), prices in buckets.items():
+            values = [price for block_id, price in prices]
+            rollup = rollups.get((symbol, timestamp))
+
+            if rollup is None:
+                rollup = model(
+                    symbol=symbol,
+                    timestamp=timestamp,
+                    open=values[0],
+                    high=values[0],
+                    low=values[0],
+                    sum=0,
+                    count=0,
+                    first_block_id=prices[0][0]
+                )
+                self.session.add(rollup)
+
+            rollup.high = max(rollup.high, max(values))
+            rollup.low = min(rollup.low, min(values))
+            rollup.close = values[-1]
+            rollup.sum += sum(values)
+            rollup.count += len(values)
+            rollup.last_block_id = prices[-1][0]
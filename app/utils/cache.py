@@ -0,0 +1,272 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from dogpile.cache.api import NO_VALUE
+from dogpile.util import NameRegistry
+from redis.exceptions import RedisError
+
+
+class CacheStats:
+    """ Per-worker hit and miss counters for each cache tier """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def incr(self, tier, counter):
+        with self._lock:
+            tier_counters = self._counters.setdefault(tier, {'hits': 0, 'misses': 0, 'errors': 0})
+            tier_counters[counter] = tier_counters.get(counter, 0) + 1
+
+    def hit(self, tier):
+        self.incr(tier, 'hits')
+
+    def miss(self, tier):
+        self.incr(tier, 'misses')
+
+    def error(self, tier):
+        self.incr(tier, 'errors')
+
+    def asdict(self):
+        with self._lock:
+            return {tier: dict(counters) for tier, counters in self._counters.items()}
+
+
+class LocalCache:
+    """ Bounded in-process LRU cache with a per-entry expiration time """
+
+    def __init__(self, max_size, expiration_time):
+        self.max_size = max_size
+        self.expiration_time = expiration_time
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, max_stale=0):
+        """ Retrieves value for given key
+        :param key: cache key
+        :param max_stale: also return values that expired at most this many seconds ago, but are not yet evicted
+        :returns: cached value or NO_VALUE
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return NO_VALUE
+
+            value, expires_at = entry
+
+            if expires_at + max_stale < time.time():
+                return NO_VALUE
+
+            self._entries.move_to_end(key)
+
+            return value
+
+    def set(self, key, value, expiration_time=None):
+        if expiration_time is None or expiration_time > self.expiration_time:
+            expiration_time = self.expiration_time
+
+        with self._lock:
+            self._entries[key] = (value, time.time() + expiration_time)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResponseCache:
+    """ Two-tier cache for response dicts: a per-worker LocalCache in front of the shared dogpile (redis) region """
+
+    def __init__(self, cache_region, local_cache, lock_wait_time=10, lock_sleep=0.1, retry_interval=5,
+                 local_stale_time=30):
+        self.cache_region = cache_region
+        self.local_cache = local_cache
+        self.lock_wait_time = lock_wait_time
+        self.lock_sleep = lock_sleep
+        # Seconds redis is skipped after an error, so requests don't each wait for the socket timeout
+        self.retry_interval = retry_interval
+        # Seconds an expired local value is still served while redis is unavailable
+        self.local_stale_time = local_stale_time
+        self._unavailable_until = 0
+        self.stats = CacheStats()
+        self._local_mutexes = NameRegistry(lambda identifier: threading.Lock())
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+
+    def is_available(self):
+        return time.time() >= self._unavailable_until
+
+    def set_unavailable(self, e):
+        self.stats.error('redis')
+        self._unavailable_until = time.time() + self.retry_interval
+        logging.warning('Cache region unavailable, skipped for {} seconds: {}'.format(self.retry_interval, e))
+
+    def get_mutex(self, key):
+        # Use the distributed redis lock of the region when configured, so the lock spans all workers
+        return self.cache_region.backend.get_mutex(key) or self._local_mutexes.get(key)
+
+    @staticmethod
+    def is_current(value, version):
+        return version is None or value.get('version') is None or value['version'] >= version
+
+    @staticmethod
+    def get_expiration_time(value, expiration_time):
+        # Values can carry their own expiration time, e.g. short lived negative entries
+        return value.get('expiration_time') or expiration_time
+
+    def is_fresh(self, entry, expiration_time, version=None):
+        return entry is not NO_VALUE and \
+            time.time() - entry.metadata['ct'] <= self.get_expiration_time(entry.payload, expiration_time) and \
+            self.is_current(entry.payload, version)
+
+    def get_or_create(self, key, creator, expiration_time, should_cache_fn=None, version=None,
+                      stale_while_revalidate=None, async_creator=None):
+        """ Retrieves value from the first tier that holds a fresh copy, otherwise lets a single worker
+        regenerate it while concurrent requests wait for the result or are served the stale value
+        :param key: cache key
+        :param creator: function without arguments that creates the value
+        :param expiration_time: seconds after which a stored value needs to be regenerated
+        :param should_cache_fn: function that decides if a created value is stored
+        :param version: values stored with a lower version (e.g. an older chain head) are expired, values
+        created with a `version` of None are never expired by version
+        :param stale_while_revalidate: maximum age in seconds of an expired value that is served right away
+        while it is regenerated in the background
+        :param async_creator: function used instead of `creator` to regenerate the value in a background thread
+        :returns: tuple of (value, name of tier that served the value or None when created)
+        """
+        value = self.local_cache.get(key)
+
+        if value is not NO_VALUE and self.is_current(value, version):
+            self.stats.hit('local')
+            return value, 'local'
+
+        self.stats.miss('local')
+
+        if self.is_available():
+            try:
+                return self._get_or_create_shared(
+                    key, creator, expiration_time, should_cache_fn, version, stale_while_revalidate, async_creator
+                )
+            except RedisError as e:
+                self.set_unavailable(e)
+
+        # Keep serving recently seen responses while redis is slow or down, unless expired by version
+        value = self.local_cache.get(key, max_stale=self.local_stale_time)
+
+        if value is not NO_VALUE and self.is_current(value, version):
+            self.stats.incr('local', 'stale')
+            return value, 'local'
+
+        return self._create(key, creator, expiration_time, should_cache_fn, version), None
+
+    def _get_or_create_shared(self, key, creator, expiration_time, should_cache_fn, version,
+                              stale_while_revalidate, async_creator):
+        entry = self.cache_region.backend.get(key)
+
+        if self.is_fresh(entry, expiration_time, version):
+            self.stats.hit('redis')
+            self.local_cache.set(key, entry.payload, self.get_expiration_time(entry.payload, expiration_time))
+            return entry.payload, 'redis'
+
+        self.stats.miss('redis')
+
+        if stale_while_revalidate and entry is not NO_VALUE and \
+                time.time() - entry.metadata['ct'] <= stale_while_revalidate:
+            self.refresh_async(key, async_creator or creator, expiration_time, should_cache_fn, version)
+            self.stats.incr('redis', 'stale')
+            return entry.payload, 'redis'
+
+        mutex = self.get_mutex(key)
+        wait_until = time.time() + self.lock_wait_time
+
+        while not mutex.acquire(False):
+            if entry is not NO_VALUE:
+                # Another worker is regenerating this key, serve the stale value in the meantime
+                self.stats.incr('redis', 'stale')
+                return entry.payload, 'redis'
+
+            if time.time() > wait_until:
+                logging.warning('Timeout waiting for cache lock of {}'.format(key))
+                return self._create(key, creator, expiration_time, should_cache_fn, version), None
+
+            time.sleep(self.lock_sleep)
+
+            entry = self.cache_region.backend.get(key)
+
+            if self.is_fresh(entry, expiration_time, version):
+                self.stats.hit('redis')
+                self.local_cache.set(key, entry.payload, self.get_expiration_time(entry.payload, expiration_time))
+                return entry.payload, 'redis'
+
+        try:
+            # Value could have been stored while acquiring the lock
+            entry = self.cache_region.backend.get(key)
+
+            if self.is_fresh(entry, expiration_time, version):
+                self.local_cache.set(key, entry.payload, self.get_expiration_time(entry.payload, expiration_time))
+                return entry.payload, 'redis'
+
+            return self._create(key, creator, expiration_time, should_cache_fn, version), None
+        finally:
+            self._release(key, mutex)
+
+    def refresh_async(self, key, creator, expiration_time, should_cache_fn=None, version=None):
+        """ Regenerates the value in a background thread, at most once per key in this worker and only
+        by the worker that acquires the lock of the key
+        """
+        with self._refreshing_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                # Lock is acquired within the thread, as a redis lock can only be released by its owning thread
+                mutex = self.get_mutex(key)
+
+                if mutex.acquire(False):
+                    try:
+                        self._create(key, creator, expiration_time, should_cache_fn, version)
+                    finally:
+                        self._release(key, mutex)
+            except Exception as e:
+                logging.error('Background refresh of {} failed: {}'.format(key, e))
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    @staticmethod
+    def _release(key, mutex):
+        try:
+            mutex.release()
+        except RedisError as e:
+            # Lock already expired by its lock_timeout
+            logging.warning('Could not release cache lock of {}: {}'.format(key, e))
+
+    def _create(self, key, creator, expiration_time, should_cache_fn, version):
+        value = creator()
+
+        if version is not None:
+            value.setdefault('version', version)
+
+        if should_cache_fn is None or should_cache_fn(value):
+            self.local_cache.set(key, value, self.get_expiration_time(value, expiration_time))
+
+            if self.is_available():
+                try:
+                    self.cache_region.set(key, value)
+                except RedisError as e:
+                    self.set_unavailable(e)
+
+        return value
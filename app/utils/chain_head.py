@@ -0,0 +1,101 @@
+import time
+
+from dogpile.cache.api import NO_VALUE
+from redis.exceptions import RedisError
+from sqlalchemy import func
+
+from app.models.data import Block, BlockTotal, Runtime
+
+CHAIN_HEAD_CACHE_KEY = 'ares_chain_head'
+
+# Running totals of the latest BlockTotal that are part of the head record
+CHAIN_HEAD_TOTALS = ['total_extrinsics_signed', 'total_events', 'total_events_module', 'total_accounts']
+
+
+class ChainHead:
+    """ Latest harvested and finalized block, latest block totals and runtime count, published in the cache
+    region by the scheduler
+    """
+
+    def __init__(self, cache_region, expiration_time=1, max_age=60):
+        self.cache_region = cache_region
+        self.expiration_time = expiration_time
+        self.max_age = max_age
+        self._head = None
+        self._retrieved_at = 0
+
+    @staticmethod
+    def query(session, finalized_block_id=None):
+        """ Builds the head record from the database
+        :param session: database session
+        :param finalized_block_id: latest finalized block number, None when unknown
+        :returns: dict with `block_id`, `block_hash`, `finalized_block_id`, `block_total_id`,
+        `block_total_hash`, `block_total` (dict of CHAIN_HEAD_TOTALS or None) and `runtime_count`
+        """
+        block = session.query(Block.id, Block.hash).order_by(Block.id.desc()).first()
+        block_total = BlockTotal.query(session).order_by(BlockTotal.id.desc()).first()
+        block_total_hash = None
+        totals = None
+
+        if block_total:
+            block_total_hash = session.query(Block.hash).filter(Block.id == block_total.id).scalar()
+            totals = {}
+
+            for name in CHAIN_HEAD_TOTALS:
+                value = getattr(block_total, name, None)
+                totals[name] = int(value) if value is not None else None
+
+        return {
+            'block_id': block.id if block else None,
+            'block_hash': block.hash if block else None,
+            'finalized_block_id': finalized_block_id,
+            'block_total_id': block_total.id if block_total else None,
+            'block_total_hash': block_total_hash,
+            'block_total': totals,
+            'runtime_count': session.query(func.count(Runtime.id)).scalar()
+        }
+
+    @staticmethod
+    def query_block(session):
+        """ Minimal head record with the latest harvested block only, without the totals of query()
+        :param session: database session
+        :returns: head record, see query()
+        """
+        return {
+            'block_id': session.query(func.max(Block.id)).scalar(),
+            'block_hash': None,
+            'finalized_block_id': None,
+            'block_total_id': None,
+            'block_total_hash': None,
+            'block_total': None,
+            'runtime_count': None
+        }
+
+    def get(self, session):
+        """ Retrieves the current head, kept in-process for `expiration_time` seconds
+        :param session: database session used when the scheduler has not published a recent head
+        :returns: head record, see query()
+        """
+        if self._head is not None and time.time() - self._retrieved_at < self.expiration_time:
+            return self._head
+
+        try:
+            # Heads published more than `max_age` seconds ago are expired, the scheduler is no longer updating them
+            head = self.cache_region.get(CHAIN_HEAD_CACHE_KEY, expiration_time=self.max_age)
+        except RedisError:
+            head = NO_VALUE
+
+        if head is NO_VALUE:
+            # Without the scheduler there is no finality information, only the harvested head. The totals are
+            # left out, as this runs on the request path
+            head = self.query_block(session)
+
+        self._head = head
+        self._retrieved_at = time.time()
+
+        return head
+
+    def set(self, head):
+        self.cache_region.set(CHAIN_HEAD_CACHE_KEY, head)
+        self._head = head
+        self._retrieved_at = time.time()
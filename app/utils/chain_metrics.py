@@ -0,0 +1,21 @@
+# Length and offset from the unix epoch in seconds per interval, weeks start on monday
+CHAIN_METRIC_INTERVALS = {
+    'hour': (60 * 60, 0),
+    'day': (60 * 60 * 24, 0),
+    'week': (60 * 60 * 24 * 7, 60 * 60 * 24 * 4)
+}
+
+# Metrics that are summed per interval, blocktime is averaged over the blocks of the interval
+CHAIN_METRICS = ['blocks', 'blocktime', 'accounts_new', 'extrinsics_signed', 'events', 'transfers']
+
+
+def get_interval_start(interval, timestamp):
+    length, offset = CHAIN_METRIC_INTERVALS[interval]
+    return timestamp - (timestamp - offset) % length
+
+
+def get_metric_value(rollup, metric):
+    if metric == 'blocktime':
+        return float(rollup.blocktime) / rollup.blocks if rollup.blocks else 0
+
+    return int(getattr(rollup, metric))
@@ -0,0 +1,97 @@
+from sqlalchemy import func
+
+from app.models.data import SymbolSnapshot, SymbolPriceMinute, SymbolPriceHour, SymbolPriceDay
+
+# Rollup table per supported resolution
+PRICE_ROLLUPS = {
+    '1m': SymbolPriceMinute,
+    '1h': SymbolPriceHour,
+    '1d': SymbolPriceDay
+}
+
+# Bucket size in seconds per supported resolution
+PRICE_RESOLUTIONS = {resolution: model.bucket_seconds for resolution, model in PRICE_ROLLUPS.items()}
+
+
+def get_price_buckets(session, symbol, seconds, from_time, to_time):
+    """ OHLC, mean and sample count of the prices of a symbol per time bucket, aggregated by the database
+    :param session: database session
+    :param symbol: oracle symbol
+    :param seconds: bucket size in seconds
+    :param from_time: unix timestamp of the start of the range (inclusive)
+    :param to_time: unix timestamp of the end of the range (exclusive)
+    :returns: list of dicts with timestamp, open, high, low, close, mean and count, ordered by timestamp
+    """
+    bucket = func.floor(func.unix_timestamp(SymbolSnapshot.created_at) / seconds)
+    value = SymbolSnapshot.price / func.pow(10, SymbolSnapshot.fraction)
+
+    rows = session.query(
+        bucket, func.min(SymbolSnapshot.block_id), func.max(SymbolSnapshot.block_id),
+        func.max(value), func.min(value), func.avg(value), func.count(value)
+    ).filter(
+        SymbolSnapshot.symbol == symbol,
+        SymbolSnapshot.price.isnot(None),
+        SymbolSnapshot.created_at >= func.from_unixtime(from_time),
+        SymbolSnapshot.created_at < func.from_unixtime(to_time)
+    ).group_by(bucket).order_by(bucket).all()
+
+    if not rows:
+        return []
+
+    # Open and close are the prices of the first and last snapshot with a price of each bucket
+    block_ids = {row[1] for row in rows} | {row[2] for row in rows}
+    prices = dict(session.query(SymbolSnapshot.block_id, value).filter(
+        SymbolSnapshot.symbol == symbol,
+        SymbolSnapshot.price.isnot(None),
+        SymbolSnapshot.block_id.in_(list(block_ids))
+    ))
+
+    return [
+        {
+            'timestamp': int(bucket_id) * seconds,
+            'open': float(prices[first_block_id]),
+            'high': float(high),
+            'low': float(low),
+            'close': float(prices[last_block_id]),
+            'mean': float(mean),
+            'count': count
+        }
+        for bucket_id, first_block_id, last_block_id, high, low, mean, count in rows
+    ]
+
+
+def get_price_series(session, symbol, resolution, from_time, to_time):
+    """ Price buckets from the rollup table of the resolution. Buckets from the last rolled up bucket of the
+    symbol onwards are aggregated from the snapshots, as these are not (completely) rolled up yet
+    :param session: database session
+    :param symbol: oracle symbol
+    :param resolution: key of PRICE_ROLLUPS
+    :param from_time: unix timestamp of the start of the range (inclusive)
+    :param to_time: unix timestamp of the end of the range (exclusive)
+    :returns: list of dicts with timestamp, open, high, low, close, mean and count, ordered by timestamp
+    """
+    model = PRICE_ROLLUPS[resolution]
+
+    rolled_up_until = session.query(func.max(model.timestamp)).filter(model.symbol == symbol).scalar()
+
+    if rolled_up_until is None:
+        return get_price_buckets(session, symbol, model.bucket_seconds, from_time, to_time)
+
+    rollups = model.query(session).filter(
+        model.symbol == symbol,
+        model.timestamp >= from_time - from_time % model.bucket_seconds,
+        model.timestamp < min(to_time, rolled_up_until)
+    ).order_by(model.timestamp)
+
+    return [
+        {
+            'timestamp': rollup.timestamp,
+            'open': rollup.open,
+            'high': rollup.high,
+            'low': rollup.low,
+            'close': rollup.close,
+            'mean': rollup.sum / rollup.count,
+            'count': rollup.count
+        }
+        for rollup in rollups
+    ] + get_price_buckets(session, symbol, model.bucket_seconds, max(from_time, rolled_up_until), to_time)
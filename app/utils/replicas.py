@@ -0,0 +1,124 @@
+import itertools
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import func, select
+
+from app.models.data import Block
+
+REPLICA_SELECTION_ROUND_ROBIN = 'round_robin'
+REPLICA_SELECTION_LEAST_CONNECTIONS = 'least_connections'
+
+
+class Replica:
+
+    def __init__(self, engine, session_factory):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.block_id = None
+        self.healthy = False
+
+    def get_connections(self):
+        """ Number of connections checked out of the pool of the replica, pools without a count report 0 """
+        checkedout = getattr(self.engine.pool, 'checkedout', None)
+        return checkedout() if checkedout else 0
+
+
+class ReplicaSet:
+    """ Per-process set of read replicas. Replicas whose last harvested block trails the primary by more than
+    `max_lag` blocks are skipped; lag is checked every `check_interval` seconds by a background thread, requests
+    only read the result of the last check
+    """
+
+    def __init__(self, primary_engine, replicas, selection=REPLICA_SELECTION_ROUND_ROBIN, max_lag=10,
+                 check_interval=10):
+        if selection not in (REPLICA_SELECTION_ROUND_ROBIN, REPLICA_SELECTION_LEAST_CONNECTIONS):
+            raise ValueError('Unknown replica selection "{}"'.format(selection))
+
+        self.primary_engine = primary_engine
+        self.replicas = replicas
+        self.selection = selection
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0
+        self._thread_pid = None
+        self._counter = itertools.count()
+
+    @staticmethod
+    def get_max_block_id(engine):
+        with engine.connect() as connection:
+            return connection.execute(select([func.max(Block.id)])).scalar()
+
+    def check_lag(self):
+        """ Compares the last block of each replica with the primary, unreachable replicas are unhealthy """
+        primary_block_id = self.get_max_block_id(self.primary_engine)
+
+        for replica in self.replicas:
+            try:
+                replica.block_id = self.get_max_block_id(replica.engine)
+            except Exception as e:
+                logging.warning('Replica {} unavailable: {}'.format(replica.engine.url, e))
+                replica.block_id = None
+                replica.healthy = False
+                continue
+
+            if primary_block_id is None:
+                replica.healthy = True
+            else:
+                replica.healthy = replica.block_id is not None and \
+                                  primary_block_id - replica.block_id <= self.max_lag
+
+            if not replica.healthy:
+                logging.warning('Replica {} lags at block {}, primary at block {}'.format(
+                    replica.engine.url, replica.block_id, primary_block_id
+                ))
+
+    def start(self):
+        """ Starts the lag check thread of this process. Started on first use instead of on creation, so it also
+        runs in workers forked after the application is loaded
+        """
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self.run, name='replica-lag-check', daemon=True).start()
+
+    def run(self):
+        while True:
+            try:
+                self.check_lag()
+                self._checked_at = time.time()
+            except Exception as e:
+                logging.warning('Replica lag check failed: {}'.format(e))
+                for replica in self.replicas:
+                    replica.healthy = False
+
+            time.sleep(self.check_interval)
+
+    def get_healthy_replicas(self):
+        if self._thread_pid != os.getpid():
+            self.start()
+
+        if time.time() - self._checked_at > self.check_interval * 3:
+            # No recent check, e.g. it hangs on an unresponsive replica, the primary is used until it completes
+            return []
+
+        return [replica for replica in self.replicas if replica.healthy]
+
+    def get_replica(self):
+        """ Replica to use for the next request
+        :returns: Replica or None when no replica is healthy
+        """
+        replicas = self.get_healthy_replicas()
+
+        if not replicas:
+            return None
+
+        if self.selection == REPLICA_SELECTION_LEAST_CONNECTIONS:
+            return min(replicas, key=lambda r: r.get_connections())
+
+        return replicas[next(self._counter) % len(replicas)]
@@ -0,0 +1,165 @@
+import threading
+import time
+
+from dogpile.util import NameRegistry
+from sqlalchemy import func
+from sqlalchemy.orm import defer
+
+from app.models.data import Runtime, RuntimeModule, RuntimeCall, RuntimeEvent, RuntimeErrorMessage, \
+    RuntimeConstant, RuntimeStorage
+
+
+class RuntimeSpec:
+    """ Runtime metadata of a single spec version, indexed by (module_id, name) """
+
+    def __init__(self, session, spec_version):
+        self.spec_version = spec_version
+
+        self.modules = RuntimeModule.query(session).filter_by(spec_version=spec_version).order_by(
+            RuntimeModule.lookup, RuntimeModule.id
+        ).all()
+        self.calls = RuntimeCall.query(session).filter_by(spec_version=spec_version).order_by(
+            RuntimeCall.lookup, RuntimeCall.id
+        ).all()
+        self.events = RuntimeEvent.query(session).filter_by(spec_version=spec_version).order_by(
+            RuntimeEvent.lookup, RuntimeEvent.id
+        ).all()
+        self.errors = RuntimeErrorMessage.query(session).filter_by(spec_version=spec_version).order_by(
+            RuntimeErrorMessage.name, RuntimeErrorMessage.index
+        ).all()
+        self.constants = RuntimeConstant.query(session).filter_by(spec_version=spec_version).order_by(
+            RuntimeConstant.name
+        ).all()
+        self.storage = RuntimeStorage.query(session).filter_by(spec_version=spec_version).order_by(
+            RuntimeStorage.name
+        ).all()
+
+        self.module_index = {module.module_id: module for module in self.modules}
+        self.call_index = {(call.module_id, call.call_id): call for call in self.calls}
+        self.event_index = {(event.module_id, event.event_id): event for event in self.events}
+        self.error_index = {(error.module_index, error.index): error for error in self.errors}
+        self.constant_index = {(constant.module_id, constant.name): constant for constant in self.constants}
+        self.storage_index = {(storage.module_id, storage.name): storage for storage in self.storage}
+
+    def get_module_items(self, items, module_id):
+        return [item for item in items if item.module_id == module_id]
+
+
+class RuntimeRegistry:
+    """ Per-process registry of runtime metadata. Metadata of a spec version never changes, so it is loaded
+    once per spec version; the list of runtimes is refreshed every `refresh_interval` seconds to pick up
+    runtime upgrades
+    """
+
+    def __init__(self, refresh_interval=60, missing_spec_expiration_time=10):
+        self.refresh_interval = refresh_interval
+        # Seconds a spec version without metadata is remembered before it is loaded again
+        self.missing_spec_expiration_time = missing_spec_expiration_time
+        self._lock = threading.Lock()
+        self._spec_locks = NameRegistry(lambda identifier: threading.Lock())
+        self._runtimes = []
+        self._refreshed_at = 0
+        self._specs = {}
+        self._missing_specs = {}
+
+    def _load(self, session, loader):
+        # Load in a separate session, so the objects can be shared between requests as detached objects
+        registry_session = session.session_factory()
+
+        try:
+            result = loader(registry_session)
+            registry_session.expunge_all()
+            return result
+        finally:
+            registry_session.close()
+
+    def get_runtimes(self, session):
+        """ Runtimes ordered by id descending, without the metadata JSON columns
+        :param session: request session, used for its session factory
+        :returns: list of Runtime
+        """
+        if time.time() - self._refreshed_at > self.refresh_interval:
+            with self._lock:
+                if time.time() - self._refreshed_at > self.refresh_interval:
+                    self._runtimes = self._load(session, lambda registry_session: Runtime.query(
+                        registry_session
+                    ).options(
+                        defer('json_metadata'), defer('json_metadata_decoded')
+                    ).order_by(Runtime.id.desc()).all())
+
+                    self._refreshed_at = time.time()
+
+        return self._runtimes
+
+    def get_runtime(self, session, runtime_id):
+        for runtime in self.get_runtimes(session):
+            if runtime.id == runtime_id:
+                return runtime
+
+    def get_latest_spec_version(self, session):
+        runtimes = self.get_runtimes(session)
+
+        if runtimes:
+            return max(runtime.spec_version for runtime in runtimes)
+
+        return self._load(session, lambda registry_session: registry_session.query(
+            func.max(Runtime.spec_version)
+        ).scalar())
+
+    def get_spec(self, session, spec_version):
+        """ Metadata of given spec version, loaded on first use
+        :param session: request session, used for its session factory
+        :param spec_version: runtime spec version
+        :returns: RuntimeSpec
+        """
+        spec_version = int(spec_version)
+        spec = self.get_loaded_spec(spec_version)
+
+        if spec is None:
+            # Only requests for the same spec version wait for its load
+            spec_lock = self._spec_locks.get(spec_version)
+
+            with spec_lock:
+                spec = self.get_loaded_spec(spec_version)
+
+                if spec is None:
+                    spec = self._load(session, lambda registry_session: RuntimeSpec(registry_session, spec_version))
+
+                    if spec.modules:
+                        self._specs[spec_version] = spec
+                        self._missing_specs.pop(spec_version, None)
+                    else:
+                        # Metadata of a runtime that is not harvested yet, or an unknown spec version, is loaded
+                        # again after a short while
+                        self._missing_specs[spec_version] = (spec, time.time() + self.missing_spec_expiration_time)
+
+        return spec
+
+    def get_loaded_spec(self, spec_version):
+        spec = self._specs.get(spec_version)
+
+        if spec is None:
+            spec, expires_at = self._missing_specs.get(spec_version, (None, 0))
+
+            if expires_at < time.time():
+                return None
+
+        return spec
+
+    def get_module(self, session, spec_version, module_id):
+        return self.get_spec(session, spec_version).module_index.get(module_id)
+
+    def get_call(self, session, spec_version, module_id, call_id):
+        return self.get_spec(session, spec_version).call_index.get((module_id, call_id))
+
+    def get_event(self, session, spec_version, module_id, event_id):
+        return self.get_spec(session, spec_version).event_index.get((module_id, event_id))
+
+    def get_error(self, session, spec_version, module_index, index):
+        return self.get_spec(session, spec_version).error_index.get((module_index, index))
+
+    def get_constant(self, session, spec_version, module_id, name):
+        return self.get_spec(session, spec_version).constant_index.get((module_id, name))
+
+    def get_storage(self, session, spec_version, module_id, name):
+        return self.get_spec(session, spec_version).storage_index.get((module_id, name))